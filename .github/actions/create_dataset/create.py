@@ -1,4 +1,5 @@
-from covid19_datasets import Combined
+from covid19_datasets import incremental, instrumentation
+import argparse
 import pandas as pd
 
 import logging
@@ -6,15 +7,31 @@ _log = logging.getLogger(__name__)
 
 
 OUTPUT_FILENAME = './dataset/combined_dataset_latest.csv'
+SNAPSHOT_FILENAME = './dataset/combined_dataset_latest.parquet'
 
 
 def main():
+	parser = argparse.ArgumentParser(description='Generate the combined dataset')
+	parser.add_argument('--workers', type=int, default=8, help='Number of sources to load concurrently')
+	parser.add_argument('--full', action='store_true', help='Rebuild from scratch instead of updating the previous snapshot')
+	parser.add_argument('--verify', action='store_true', help='Check that an incremental update equals a full rebuild')
+	parser.add_argument('--report', help='Write a JSON report with the time, memory, downloads and rows of every stage to this path')
+	parser.add_argument('--memory', action='store_true', help='Measure the peak memory of every stage in the report (slow)')
+	parser.add_argument('--profile', nargs='*', default=[], help='Names of stages to profile in the report, * for all')
+	args = parser.parse_args()
+
+	if args.report:
+		instrumentation.enable(memory=args.memory, profile=args.profile)
+
 	_log.info('Generating combined dataset')
-	combined = Combined()
-	data = combined.get_data()
+	data = incremental.update_snapshot(SNAPSHOT_FILENAME, workers=args.workers, full=args.full, verify=args.verify)
+	_log.info('Wrote snapshot to: ' + SNAPSHOT_FILENAME)
 	data.to_csv(OUTPUT_FILENAME)
 	_log.info('Wrote output to: ' + OUTPUT_FILENAME)
 
+	if args.report:
+		instrumentation.write_report(args.report)
+
 
 
 if __name__ == '__main__':
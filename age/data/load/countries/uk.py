@@ -96,7 +96,7 @@ def _load_raw_cases():
     females['Sex'] = 'f'
 
     cases = pd.concat([males, females], axis=0)
-    cases['Date'] = cases['Week'].apply(lambda w: utils.last_day_of_calenderweek(2020, w))
+    cases['Date'] = utils.week_end_dates(2020, cases['Week'])  # The PHE report only covers 2020
     cases = cases.drop('Week', axis='columns')
 
     return cases
@@ -54,8 +54,9 @@ def _load_raw_cases():
         cases_raw.loc[:, col] = cases_raw.loc[:, col].str.replace(',', '').astype(float)
 
     us_cases = cases_raw.groupby('Week', as_index=False).sum()
-    us_cases.Week = us_cases.Week.astype(str).apply(lambda w: w[-2:]).astype(int)
-    us_cases['Date'] = us_cases.Week.apply(lambda w: utils.last_day_of_calenderweek(2020, w))
+    # Weeks are written as year then week number, e.g. 202010
+    weeks = us_cases.Week.astype(str)
+    us_cases['Date'] = utils.week_end_dates(weeks.str.slice(stop=4).astype(int), weeks.str.slice(start=-2).astype(int))
     us_cases = us_cases.drop('Week', axis='columns').set_index('Date')
     us_cases = us_cases.stack().reset_index().rename(columns={'level_1': 'Age', 0: 'cases_new'})
     us_cases['Sex'] = 'b'
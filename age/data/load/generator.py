@@ -1,17 +1,35 @@
 """Generate age and sex disaggregatred data for multiple countries."""
+import os
 import pandas as pd
+from covid19_datasets import cache
+from covid19_datasets import instrumentation
+from covid19_datasets.snapshot import read_snapshot
 from age.data.load.countries import austria, belgium, brazil, canada, chile, czechia, denmark, finland, france, germany, hongkong, india, italy, korea, mexico, netherlands, portugal, uk, usa
 
 import logging
 _log = logging.getLogger(__name__)
 
-_REFERENCE_DATA_PATH = 'https://raw.githubusercontent.com/rs-delve/covid19_datasets/master/dataset/combined_dataset_latest.csv'
+_REFERENCE_DATA_PATH = 'https://raw.githubusercontent.com/rs-delve/covid19_datasets/master/dataset/combined_dataset_latest.parquet'
+_REFERENCE_COLUMNS = ['cases_new', 'deaths_new']
+
+
+@instrumentation.instrumented()
+def _load_reference_data(path):
+    if path.endswith('.parquet') and not (cache.exists(path) if '://' in path else os.path.exists(path)):
+        # The snapshot is only published by newer builds, the CSV is always next to it
+        _log.warning(f'No snapshot at {path}, reading the CSV instead')
+        path = os.path.splitext(path)[0] + '.csv'
+    if not path.endswith('.parquet'):
+        return pd.read_csv(path, parse_dates=['DATE'])
+    if '://' in path:
+        path = cache.fetch(path)
+    return read_snapshot(path, columns=_REFERENCE_COLUMNS).reset_index()
 
 
 class Generator():
 
-    def __init__(self):
-        self._reference_data = pd.read_csv(_REFERENCE_DATA_PATH, parse_dates=['DATE'])
+    def __init__(self, reference_data_path=_REFERENCE_DATA_PATH):
+        self._reference_data = _load_reference_data(reference_data_path)
         self._country_loaders = self._create_country_loaders(self._reference_data)
 
     def _create_country_loaders(self, reference_data):
@@ -35,20 +53,21 @@ class Generator():
         }
         return country_loaders
 
+    @instrumentation.instrumented()
     def generate_dataset(self):
         all_cases = []
         all_deaths = []
 
         for iso, loader in self._country_loaders.items():
             _log.info(f'Loading {iso}')
-            cases = loader.cases()
+            cases = instrumentation.record(f'{iso}.cases', loader.cases)
             if cases is not None:
                 all_cases.append(cases)
-            deaths = loader.deaths()
+            deaths = instrumentation.record(f'{iso}.deaths', loader.deaths)
             if deaths is not None:
                 all_deaths.append(deaths)
 
         cases = pd.concat(all_cases, axis=0)
         deaths = pd.concat(all_deaths, axis=0)
 
-        return pd.merge(cases, deaths, on=['Date', 'Age', 'Sex'])
+        return instrumentation.record('age.merge', pd.merge, cases, deaths, on=['Date', 'Age', 'Sex'])
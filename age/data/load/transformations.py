@@ -1,6 +1,8 @@
 import pandas as pd
+from covid19_datasets import instrumentation
 
 
+@instrumentation.instrumented()
 def add_both_sexes(data: pd.DataFrame) -> pd.DataFrame:
     """Add male and female data to obtain data for both sexes combined."""
     if len(data.Sex.unique()) != 2:
@@ -11,6 +13,7 @@ def add_both_sexes(data: pd.DataFrame) -> pd.DataFrame:
     return pd.concat([data, both], axis=0)
 
 
+@instrumentation.instrumented()
 def rescale(data: pd.DataFrame, ref_data: pd.DataFrame, field: str) -> pd.DataFrame:
     """Proportionally rescale data so that totals match daily totals given in ref_data"""
     scale = data.query('Sex == "b"').groupby('Date').sum().merge(
@@ -25,6 +28,7 @@ def rescale(data: pd.DataFrame, ref_data: pd.DataFrame, field: str) -> pd.DataFr
     return data
 
 
+@instrumentation.instrumented()
 def periodic_to_daily(data: pd.DataFrame) -> pd.DataFrame:
     """Convert a dataframe that has new cases or deaths sampled periodically to daily sampling."""
     process_df = data.set_index(['Date', 'Age', 'Sex']).unstack().unstack().fillna(0).reset_index()
@@ -39,6 +43,7 @@ def periodic_to_daily(data: pd.DataFrame) -> pd.DataFrame:
     return process_df
 
 
+@instrumentation.instrumented()
 def smooth_sample(data: pd.DataFrame, rolling_window: int = 3) -> pd.DataFrame:
     """Apply smoothing to a sample of data."""
     return round(
@@ -48,6 +53,7 @@ def smooth_sample(data: pd.DataFrame, rolling_window: int = 3) -> pd.DataFrame:
         .mean()).stack().stack().reset_index()
 
 
+@instrumentation.instrumented()
 def cumulative_to_new(data: pd.DataFrame) -> pd.DataFrame:
     """Convert a time series of cumulative counts in tidy format to a one that of daily counts."""
     return (data
@@ -60,6 +66,7 @@ def cumulative_to_new(data: pd.DataFrame) -> pd.DataFrame:
             .reset_index())
 
 
+@instrumentation.instrumented()
 def ensure_contiguous(data):
     """Ensure the dates are contiguous in the given data."""
     data = data.drop_duplicates(['Date', 'Sex', 'Age'])
@@ -2,6 +2,8 @@ import pandas as pd
 import datetime
 import numpy as np
 
+from covid19_datasets.utils import last_day_of_calenderweek, week_end_dates
+
 def map_age(age):
     """Map ages to standard buckets."""
     try:
@@ -19,12 +21,6 @@ def map_age(age):
         return age
 
 
-def last_day_of_calenderweek(year, week):
-    first = datetime.date(year, 1, 1)
-    base = 1 if first.isocalendar()[1] == 1 else 8
-    return first + datetime.timedelta(days=base - first.isocalendar()[2] + 7 * (week - 1) + 6)
-
-
 def age_string_to_tuple(ages: str) -> (int, int):
     '''Converts string age format to tuple of integers (lower, upper).
     Eg. \'10-14\' becomes (10, 14), or \'85+' to (85, np.float(inf))
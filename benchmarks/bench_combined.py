@@ -0,0 +1,173 @@
+"""
+Benchmarks for the source loaders and the combined dataset.
+
+Every loader is run against fixtures served by a local stand-in, timing each
+stage separately: download, parse, standardise and merge.
+"""
+
+import functools
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from covid19_datasets import acaps_government_measures, cache, combined, compact, query, shared
+from covid19_datasets import (OWIDCovid19, OxfordGovernmentPolicyDataset, MaskPolicies, Mobility, AppleMobility,
+                              EconomistExcessMortality, EuroStatExcessMortality, HMDExcessMortality, JohnsHopkins,
+                              UNDeathsByCountry, Weather, YouGovBehaviouralTracker, WorldBankDataBank, AcapsGovernmentMeasures)
+
+import fixtures
+import legacy
+from server import FixtureServer
+
+
+_LOADERS = {
+    'owid': OWIDCovid19,
+    'oxford': OxfordGovernmentPolicyDataset,
+    'masks': MaskPolicies,
+    'google_mobility': Mobility,
+    'apple_mobility': AppleMobility,
+    'economist': EconomistExcessMortality,
+    'eurostat': EuroStatExcessMortality,
+    'hmd': HMDExcessMortality,
+    'johns_hopkins': JohnsHopkins,
+    'un_deaths': UNDeathsByCountry,
+    'weather': Weather,
+    'yougov': YouGovBehaviouralTracker,
+    'world_bank': WorldBankDataBank,
+}
+
+# Standardisation steps of loaders that are not part of Combined
+_STANDARDISE = {
+    'hmd': lambda: HMDExcessMortality().get_data(daily=True),
+    'johns_hopkins': lambda: JohnsHopkins().get_data(),
+}
+
+
+def _loaded_data(loader):
+    return loader._data if hasattr(loader, '_data') else loader.data
+
+
+def _parse(loader):
+    loader(force_load=True)
+    return _loaded_data(loader)
+
+
+def _parse_workbook():
+    """Parse the ACAPS workbook, rather than the report parsed by an earlier run."""
+    shutil.rmtree(os.path.join(cache.cache_dir(), acaps_government_measures._PARSED_DIRNAME), ignore_errors=True)
+    return _parse(AcapsGovernmentMeasures)
+
+
+def _region_data(iso, check):
+    if check:
+        Mobility._regions_checked = False
+    return Mobility().get_region_data(iso)
+
+
+def _download(urls):
+    cache.clear()
+    for url in urls:
+        cache.fetch(url)
+
+
+def _fetch_all(files):
+    for urls in files.values():
+        for url in urls:
+            cache.fetch(url)
+
+
+def _queries(select, name, isos, start, end, columns):
+    """Point queries of every country, a month of a few columns of every country, or a month of ten countries."""
+    if name == 'point':
+        return [select([iso], end, end) for iso in isos]
+    if name == 'range':
+        return [select([iso], start, end, columns) for iso in isos]
+    return [select(isos[:10], start, end)]
+
+
+def _compare_queries(bench, data, isos, start, end, columns):
+    indexed = bench.run('query/index', query.IndexedDataset, data)
+    for name in ['point', 'range', 'countries']:
+        expected = bench.run(f'legacy/query_{name}', _queries, functools.partial(legacy.combined_select, data),
+                             name, isos, start, end, columns)
+        result = bench.run(f'kernel/query_{name}', _queries, indexed.select, name, isos, start, end, columns)
+        for r, e in zip(result, expected):
+            pd.testing.assert_frame_equal(r.sort_index(), e.sort_index())
+
+
+def _mapped_values(series):
+    """The arrays holding the values of a column, which should be mapped from the published files."""
+    values = series.array
+    if isinstance(values, pd.Categorical):
+        return [values.codes]
+    if isinstance(values, shared._MASKED_ARRAYS):
+        return [values._data, values._mask]
+    return [series.to_numpy()]
+
+
+def _is_mapped(values):
+    while values is not None and not isinstance(values, np.memmap):
+        values = values.base
+    return values is not None
+
+
+def _compare_shared(bench, data, name):
+    with tempfile.TemporaryDirectory() as directory:
+        path = bench.run(f'shared/publish_{name}', shared.publish, data, os.path.join(directory, name))
+        attached = bench.run(f'shared/attach_{name}', shared.attach, path)
+        pd.testing.assert_frame_equal(attached, data)
+        for column, dtype in attached.dtypes.items():
+            if pd.api.types.is_object_dtype(dtype):
+                continue
+            for values in _mapped_values(attached[column]):
+                assert _is_mapped(values) and not values.flags.writeable, f'{column} is not shared'
+
+
+def run(bench, scale):
+    files = fixtures.source_files(scale)
+    all_files = {url: content for source in files.values() for url, content in source.items()}
+
+    with FixtureServer(all_files) as server, tempfile.TemporaryDirectory() as cache_dir:
+        cache.configure(cache_dir=cache_dir, ttl=math.inf, mirror=server.url)
+        try:
+            for name, urls in files.items():
+                bench.run(f'download/{name}', _download, urls)
+            _fetch_all(files)
+
+            for name, loader in _LOADERS.items():
+                bench.run(f'parse/{name}', _parse, loader)
+            # The ACAPS workbook is only parsed once, later loads read the parsed report
+            bench.run('parse/acaps', _parse_workbook)
+            bench.run('parse/acaps_parsed', _parse, AcapsGovernmentMeasures)
+
+            iso = fixtures._countries(scale)[0].alpha_3
+            bench.run('regions/split', _region_data, iso, True)
+            bench.run('regions/unchanged', _region_data, iso, True)
+            bench.run('regions/read', _region_data, iso, False)
+
+            sources = {}
+            for name, load in combined._SOURCES.items():
+                sources[name] = bench.run(f'standardise/{name}', load)
+            for name, standardise in _STANDARDISE.items():
+                bench.run(f'standardise/{name}', standardise)
+
+            expected = bench.run('legacy/merge_combined', legacy.combined_merge, sources)
+            data = bench.run('merge/combined', combined._combine, sources)
+            pd.testing.assert_frame_equal(data, expected)
+            dates = data.index.get_level_values('DATE')
+            _compare_queries(bench, data, sorted(data.index.unique('ISO')), dates.max() - pd.Timedelta(days=30),
+                             dates.max(), ['cases_new', 'deaths_new', 'npi_stringency_index'])
+            _compare_shared(bench, data, 'combined')
+            _compare_shared(bench, compact.compact_dtypes(data), 'compact')
+
+            # A warm restart revalidates every file, but should not download anything
+            cache.configure(ttl=0)
+            sent = server.bytes_sent
+            bench.run('download/warm_restart', _fetch_all, files)
+            print(f'Warm restart downloaded {server.bytes_sent - sent} bytes')
+        finally:
+            cache.configure(mirror='')
@@ -0,0 +1,89 @@
+"""
+Benchmarks for the age and sex disaggregated dataset generator.
+
+The country loaders download PDFs, Excel workbooks and zip files from many
+different sites, so they are replaced by synthetic loaders that feed realistic
+weekly age and sex samples through the same transformations.
+"""
+
+import numpy as np
+import pandas as pd
+
+from age.data.load import transformations
+from age.data.load.countries import base
+from age.data.load.generator import Generator
+
+
+_AGES = ['0-9', '10-19', '20-29', '30-39', '40-49', '50-59', '60-69', '70-79', '80-89', '90+']
+_SEXES = ['m', 'f']
+_COUNTRIES = 16
+_WEEKS = 40
+
+
+def _weekly_samples(rng, field, rate):
+    dates = pd.date_range('2020-03-01', periods=_WEEKS, freq='7D')
+    df = pd.MultiIndex.from_product([dates, _AGES, _SEXES], names=['Date', 'Age', 'Sex']).to_frame(index=False)
+    df[field] = rng.poisson(rate, len(df)).astype(float)
+    return df
+
+
+def _reference_data(isos, rng):
+    dates = pd.date_range('2020-01-01', periods=300, freq='D')
+    df = pd.MultiIndex.from_product([isos, dates], names=['ISO', 'DATE']).to_frame(index=False)
+    df['cases_new'] = rng.poisson(1000, len(df)).astype(float)
+    df['deaths_new'] = rng.poisson(30, len(df)).astype(float)
+    return df
+
+
+class _SyntheticLoader(base.LoaderBase):
+    def __init__(self, iso, rng, reference_data):
+        self._iso = iso
+        self._raw_cases = _weekly_samples(rng, 'cases_new', 500)
+        self._raw_deaths = _weekly_samples(rng, 'deaths_new', 20)
+        self._reference_data = reference_data
+
+    def raw_cases(self) -> pd.DataFrame:
+        return self._raw_cases
+
+    def raw_deaths(self) -> pd.DataFrame:
+        return self._raw_deaths
+
+    def cases(self) -> pd.DataFrame:
+        cases = transformations.add_both_sexes(self.raw_cases())
+        cases = transformations.periodic_to_daily(cases)
+        cases = transformations.rescale(cases, self._reference_data.query(f'ISO == "{self._iso}"'), 'cases_new')
+        cases['ISO'] = self._iso
+        return cases
+
+    def deaths(self) -> pd.DataFrame:
+        deaths = transformations.add_both_sexes(self.raw_deaths())
+        deaths = transformations.periodic_to_daily(deaths)
+        deaths = transformations.smooth_sample(deaths)
+        deaths['ISO'] = self._iso
+        return deaths
+
+
+def _generator(scale, rng):
+    isos = [f'X{i:02d}' for i in range(max(1, int(round(_COUNTRIES * scale))))]
+    reference_data = _reference_data(isos, rng)
+    generator = Generator.__new__(Generator)
+    generator._reference_data = reference_data
+    generator._country_loaders = {iso: _SyntheticLoader(iso, rng, reference_data) for iso in isos}
+    return generator
+
+
+def run(bench, scale):
+    rng = np.random.default_rng(0)
+    generator = _generator(scale, rng)
+    iso, loader = next(iter(generator._country_loaders.items()))
+    reference = generator._reference_data.query(f'ISO == "{iso}"')
+
+    both = bench.run('transform/add_both_sexes', transformations.add_both_sexes, loader.raw_cases())
+    daily = bench.run('transform/periodic_to_daily', transformations.periodic_to_daily, both)
+    bench.run('transform/rescale', transformations.rescale, daily, reference, 'cases_new')
+    bench.run('transform/smooth_sample', transformations.smooth_sample, daily)
+    bench.run('transform/ensure_contiguous', transformations.ensure_contiguous, both)
+    cumulative = both.assign(cases_new=both.groupby(['Age', 'Sex']).cases_new.cumsum())
+    bench.run('transform/cumulative_to_new', transformations.cumulative_to_new, cumulative)
+
+    bench.run('generate/generate_dataset', generator.generate_dataset)
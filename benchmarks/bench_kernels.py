@@ -0,0 +1,153 @@
+"""
+Benchmarks of optimised code paths against the implementations they replaced.
+Each pair is run on the same input and the outputs must be equal.
+"""
+
+import io
+import math
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from covid19_datasets import (cache, economist_excess_mortality, eurostat, johns_hopkins, mobility, our_world_in_data,
+                              oxford_government_policy, uk_area_stats, utils, yougov_behavioural_tracker)
+
+import fixtures
+import legacy
+from server import FixtureServer
+
+
+def _compare(bench, name, current, previous, *args):
+    expected = bench.run(f'legacy/{name}', previous, *args)
+    result = bench.run(f'kernel/{name}', current, *args)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def _country_names(scale):
+    """Country names as they appear in the sources, one row per country and week."""
+    aliases = fixtures.country_aliases(scale, None)[utils._COUNTRY_ALIASES_PATH]
+    names = pd.read_csv(io.BytesIO(aliases), keep_default_na=False).COUNTRY
+    return pd.Series(np.tile(names.to_numpy(), max(1, int(round(52 * scale)))))
+
+
+# Names that the alias table resolves and the previous lookup did not, or resolved to another country
+_COUNTRY_ISO_CHANGES = {
+    'Bahamas, The': 'BHS',
+    'Burma': 'MMR',
+    'Congo, Democratic Republic of the': 'COD',
+    'Congo, Republic of the': 'COG',
+    'Curacao': 'CUW',  # NLD before
+    'Falkland Islands (Islas Malvinas)': 'FLK',
+    'French Southern and Antarctic Lands': 'ATF',
+    'Gambia, The': 'GMB',
+    'Gaza Strip': 'PSE',
+    'Holy See (Vatican City)': 'VAT',
+    'Korea, North': 'PRK',
+    'Korea, South': 'KOR',
+    'Macau': 'MAC',
+    'Pitcairn Islands': 'PCN',
+    'Saint Helena, Ascension, and Tristan da Cunha': 'SHN',
+    'Sint Maarten': 'SXM',  # NLD before
+    'South Georgia and the Islands': 'SGS',
+    'Turkey': 'TUR',
+    'Virgin Islands': 'VIR',  # VGB before, the alias table has the US Virgin Islands under this name
+    'West Bank': 'PSE',
+}
+
+
+def _country_isos_legacy(names):
+    """The previous lookup, with the names resolved differently on purpose replaced by their new codes."""
+    isos = names.apply(legacy.get_country_iso)
+    return isos.mask(names.isin(list(_COUNTRY_ISO_CHANGES)), names.map(_COUNTRY_ISO_CHANGES)).to_frame()
+
+
+def _resolve_cold(names):
+    """Resolve names starting from empty caches, as in a new session."""
+    utils._country_index = None
+    utils._fuzzy_country_iso.cache_clear()
+    return utils.country_isos(names).to_frame()
+
+
+def _sorted(load):
+    """Long format frames are compared regardless of row order."""
+    def _load():
+        df = load()
+        return df.sort_values(johns_hopkins._KEY_COLUMNS + ['DATE']).reset_index(drop=True)
+    return _load
+
+
+def _johns_hopkins_long():
+    return _sorted(lambda: johns_hopkins._load_dataset().to_long())()
+
+
+def _johns_hopkins_by_country(series):
+    return (series
+            .sum_by('iso3', attributes=['Population'])
+            .with_new_from_cumulative({'total_cases': 'new_cases', 'total_deaths': 'new_deaths'})
+            .to_frame('new_cases'))
+
+
+def _uk_cases_data(area_type):
+    return uk_area_stats.UKCovid19Data(force_load=True, england_area_type=area_type).get_cases_data()
+
+
+def _eurostat_daily(df):
+    eurostat.EuroStatExcessMortality.data = df.copy()
+    return eurostat.EuroStatExcessMortality().get_data(daily=True)
+
+
+def _economist_daily(df):
+    economist_excess_mortality.EconomistExcessMortality.data = df
+    return economist_excess_mortality.EconomistExcessMortality().get_country_level_data(daily=True)
+
+
+def _week_end_dates_legacy(years, weeks):
+    return pd.DatetimeIndex([utils.last_day_of_calenderweek(int(y), int(w)) for y, w in zip(years, weeks)])
+
+
+def run(bench, scale):
+    files = fixtures.source_files(scale)
+    with FixtureServer(dict(files['owid'], **files['country_aliases'], **files['google_mobility'],
+                              **files['johns_hopkins'], **files['uk_area_stats'], **files['eurostat'],
+                              **files['economist'], **files['oxford'], **files['yougov'])) as server, \
+            tempfile.TemporaryDirectory() as cache_dir:
+        cache.configure(cache_dir=cache_dir, ttl=math.inf, mirror=server.url)
+        try:
+            owid = our_world_in_data._load_covid19_raw()
+            _compare(bench, 'mobility_load_dataset', mobility._load_dataset, legacy.mobility_load_dataset)
+            _compare(bench, 'johns_hopkins_long', _johns_hopkins_long, _sorted(legacy.johns_hopkins_load_dataset))
+            series = bench.run('kernel/johns_hopkins_load_dataset', johns_hopkins._load_dataset)
+            bench.run('kernel/johns_hopkins_by_country', _johns_hopkins_by_country, series)
+            _compare(bench, 'uk_cases_data', _uk_cases_data, legacy.uk_cases_data, 'ltla')
+            uk = uk_area_stats.UKCovid19Data()
+            bench.run('kernel/uk_cases_data_cached', uk.get_cases_data)
+            bench.run('kernel/uk_cases_data_long', uk.get_cases_data, True)
+            _compare(bench, 'eurostat_daily', _eurostat_daily, legacy.eurostat_daily, eurostat._load_dataset())
+            _compare(bench, 'economist_daily', _economist_daily, legacy.economist_daily,
+                     economist_excess_mortality._load_dataset())
+            oxford = oxford_government_policy.OxfordGovernmentPolicyDataset(force_load=True)
+            expected = bench.run('legacy/oxford_all_policy_changes', legacy.oxford_all_policy_changes, oxford.get_data())
+            changes = bench.run('kernel/oxford_all_policy_changes', oxford.get_all_policy_changes)
+            for iso, country_changes in expected.items():
+                pd.testing.assert_frame_equal(changes.xs(iso), country_changes.drop(columns='ISO'))
+            expected = bench.run('legacy/yougov_load_dataset', legacy.yougov_load_dataset)
+            result = bench.run('kernel/yougov_load_dataset', yougov_behavioural_tracker._load_dataset)
+            pd.testing.assert_frame_equal(result.astype({c: object for c in result.select_dtypes('category')}),
+                                          expected)
+            bench.run('kernel/yougov_load_dataset_parsed', yougov_behavioural_tracker._load_dataset)
+            country_names = _country_names(scale)
+            _compare(bench, 'country_isos', _resolve_cold, _country_isos_legacy, country_names)
+        finally:
+            cache.configure(mirror='')
+
+    filled = our_world_in_data._fill_dates(owid)
+    _compare(bench, 'owid_fill_dates', our_world_in_data._fill_dates, legacy.owid_fill_dates, owid)
+    _compare(bench, 'owid_add_days_since', lambda df: our_world_in_data._add_days_since(df.copy()),
+             legacy.owid_add_days_since, filled)
+
+    rows = max(1, int(round(200000 * scale)))
+    years, weeks = np.random.default_rng(0).integers(2010, 2022, rows), np.random.default_rng(1).integers(1, 53, rows)
+    expected = bench.run('legacy/week_end_dates', _week_end_dates_legacy, years, weeks)
+    result = bench.run('kernel/week_end_dates', utils.week_end_dates, years, weeks)
+    pd.testing.assert_index_equal(result, expected)
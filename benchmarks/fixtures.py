@@ -0,0 +1,520 @@
+"""
+Synthetic fixtures for every loader, shaped like the upstream files.
+
+Fixtures are deterministic for a given scale. Scale 1 roughly matches the size
+of the real sources in late 2020: 180 countries, 300 days, and a Google
+mobility report with 20 regions per country.
+"""
+
+import datetime
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pycountry
+
+from covid19_datasets import (acaps_government_measures, our_world_in_data, oxford_government_policy, mask_policies, mobility, apple,
+                              economist_excess_mortality, eurostat, hmd, johns_hopkins, un_deaths_by_country,
+                              weather, yougov_behavioural_tracker, world_bank, uk_area_stats, utils)
+
+
+_START_DATE = '2020-01-01'
+_DAYS = 300
+_COUNTRIES = 180
+_MOBILITY_REGIONS = 20
+_UK_AREAS = 380
+_EUROSTAT_COUNTRIES = ['Armenia', 'Bulgaria', 'Czechia', 'Estonia', 'Georgia', 'Latvia', 'Liechtenstein',
+                       'Lithuania', 'Luxembourg', 'Montenegro', 'Serbia', 'Slovakia', 'Slovenia', 'Switzerland']
+_EUROSTAT_AGES = ['Total', 'Less than 5 years', 'From 5 to 9 years', '90 years or over']
+_SEXES = ['Total', 'Males', 'Females']
+_APPLE_APP_ROOT = 'covid19-mobility-data/2020HotfixDev/v3'
+_APPLE_CSV_PATH = '/en-us/applemobilitytrends-2020-10-25.csv'
+
+
+def _countries(scale):
+    count = max(5, int(round(_COUNTRIES * scale)))
+    countries = sorted(pycountry.countries, key=lambda c: c.alpha_3)
+    return countries[:count]
+
+
+def _dates(days=_DAYS):
+    return pd.date_range(_START_DATE, periods=days, freq='D')
+
+
+def _csv(df, **kwargs):
+    return df.to_csv(index=False, **kwargs).encode('utf-8')
+
+
+def _country_days(countries, rng, gap_probability=0.02):
+    """Cross product of countries and dates with a few dates missing."""
+    dates = _dates()
+    df = pd.DataFrame({
+        'iso': np.repeat([c.alpha_3 for c in countries], len(dates)),
+        'name': np.repeat([c.name for c in countries], len(dates)),
+        'alpha_2': np.repeat([c.alpha_2 for c in countries], len(dates)),
+        'date': np.tile(dates, len(countries)),
+    })
+    return df[rng.random(len(df)) > gap_probability].reset_index(drop=True)
+
+
+def _epidemic(df, rng, rate):
+    """Cumulative counts per country that start at a random date."""
+    new = rng.poisson(rate, len(df)).astype(float)
+    start = df.groupby('iso').date.transform(lambda d: d.iloc[rng.integers(0, len(d))])
+    new[(df.date < start).values] = 0
+    cumulative = pd.Series(new).groupby(df.iso.values).cumsum().values
+    return new, cumulative
+
+
+def owid(scale, rng):
+    df = _country_days(_countries(scale), rng)
+    population = df.groupby('iso').iso.transform(lambda s: rng.integers(10 ** 5, 10 ** 9))
+    out = pd.DataFrame({
+        'iso_code': df.iso,
+        'continent': 'Europe',
+        'location': df.name,
+        'date': df.date.dt.strftime('%Y-%m-%d'),
+    })
+    out['new_cases'], out['total_cases'] = _epidemic(df, rng, 200)
+    out['new_deaths'], out['total_deaths'] = _epidemic(df, rng, 5)
+    out['new_tests'], out['total_tests'] = _epidemic(df, rng, 2000)
+    for count in ['cases', 'deaths']:
+        out[f'total_{count}_per_million'] = out[f'total_{count}'] / population * 1e6
+        out[f'new_{count}_per_million'] = out[f'new_{count}'] / population * 1e6
+    out['total_tests_per_thousand'] = out.total_tests / population * 1e3
+    out['new_tests_per_thousand'] = out.new_tests / population * 1e3
+    out['new_tests_smoothed'] = out.new_tests.rolling(7, min_periods=1).mean()
+    out['new_tests_smoothed_per_thousand'] = out.new_tests_smoothed / population * 1e3
+    for column in ['new_tests', 'total_tests', 'new_tests_per_thousand', 'total_tests_per_thousand']:
+        out.loc[rng.random(len(out)) < 0.3, column] = np.nan
+    out['stringency_index'] = rng.random(len(out)) * 100
+    out['population'] = population
+    out['population_density'] = rng.random(len(out)) * 500
+    out['median_age'] = rng.random(len(out)) * 50
+    out['gdp_per_capita'] = rng.random(len(out)) * 50000
+    return {our_world_in_data._OWID_PATH: _csv(out)}
+
+
+_OXFORD_INDICATORS = {
+    'C1_School closing': 3, 'C2_Workplace closing': 3, 'C3_Cancel public events': 2,
+    'C4_Restrictions on gatherings': 4, 'C5_Close public transport': 2, 'C6_Stay at home requirements': 3,
+    'C7_Restrictions on internal movement': 2, 'C8_International travel controls': 4, 'E1_Income support': 2,
+    'E2_Debt/contract relief': 2, 'H1_Public information campaigns': 2, 'H2_Testing policy': 3,
+    'H3_Contact tracing': 2,
+}
+_OXFORD_MONETARY = ['E3_Fiscal measures', 'E4_International support',
+                    'H4_Emergency investment in healthcare', 'H5_Investment in vaccines']
+
+
+def oxford(scale, rng):
+    countries = _countries(scale)
+    dates = _dates()
+    df = pd.DataFrame({
+        'CountryName': np.repeat([c.name for c in countries], len(dates)),
+        'CountryCode': np.repeat([c.alpha_3 for c in countries], len(dates)),
+        'RegionName': np.nan,
+        'RegionCode': np.nan,
+        'Date': np.tile(dates.strftime('%Y%m%d').astype(int), len(countries)),
+    })
+    for column, levels in _OXFORD_INDICATORS.items():
+        df[column] = rng.integers(0, levels + 1, len(df)).astype(float)
+        df.loc[rng.random(len(df)) < 0.05, column] = np.nan
+        if column.startswith('C') or column in ['E1_Income support', 'H1_Public information campaigns']:
+            df[column.split('_')[0] + '_Flag'] = rng.integers(0, 2, len(df))
+    for column in _OXFORD_MONETARY:
+        df[column] = np.where(rng.random(len(df)) < 0.01, rng.random(len(df)) * 1e10, 0.)
+    df['M1_Wildcard'] = np.nan
+    df['ConfirmedCases'] = rng.integers(0, 10 ** 6, len(df))
+    df['ConfirmedDeaths'] = rng.integers(0, 10 ** 4, len(df))
+    df['StringencyIndex'] = rng.random(len(df)) * 100
+    df['StringencyIndexForDisplay'] = df.StringencyIndex
+
+    # A few sub-national rows, which the loader filters out
+    regions = df.iloc[:len(dates)].copy()
+    regions['RegionName'] = 'Region'
+    regions['RegionCode'] = regions.CountryCode + '_R'
+    return {oxford_government_policy._OXFORD_PATH: _csv(pd.concat([df, regions]))}
+
+
+def masks(scale, rng):
+    countries = _countries(scale)
+    rows = []
+    for country in countries:
+        for date in sorted(rng.choice(_dates(), size=3, replace=False)):
+            rows.append({'ISO': country.alpha_3, 'DATE': pd.Timestamp(date).strftime('%d/%m/%Y'),
+                         'Stringency': rng.integers(0, 5), 'Source': 'synthetic'})
+    return {mask_policies._MASK_POLICY_PATH: _csv(pd.DataFrame(rows))}
+
+
+def google_mobility(scale, rng):
+    countries = _countries(scale)
+    dates = _dates()
+    regions = [None] + [f'Region {i}' for i in range(_MOBILITY_REGIONS)]
+    n = len(countries) * len(regions) * len(dates)
+    df = pd.DataFrame({
+        'country_region_code': np.repeat([c.alpha_2 for c in countries], len(regions) * len(dates)),
+        'country_region': np.repeat([c.name for c in countries], len(regions) * len(dates)),
+        'sub_region_1': np.tile(np.repeat(regions, len(dates)), len(countries)),
+        'sub_region_2': None,  # Object columns, as strings are assigned to some rows below
+        'metro_area': None,
+        'iso_3166_2_code': np.nan,
+        'census_fips_code': np.nan,
+        'date': np.tile(dates.strftime('%Y-%m-%d'), len(countries) * len(regions)),
+    })
+    # The last regions are counties and metro areas instead of states
+    counties = df.sub_region_1.isin(regions[-4:-1])
+    df.loc[counties, 'sub_region_2'] = df.loc[counties, 'sub_region_1'].str.replace('Region', 'County')
+    df.loc[counties, 'sub_region_1'] = regions[1]
+    metros = df.sub_region_1 == regions[-1]
+    df.loc[metros, 'metro_area'] = 'Metro area'
+    df.loc[metros, 'sub_region_1'] = np.nan
+    for column in mobility.COLUMN_NAMES:
+        df[column] = rng.integers(-80, 80, n).astype(float)
+        df.loc[rng.random(n) < 0.05, column] = np.nan
+    return {mobility._MOBILITY_PATH: _csv(df)}
+
+
+def apple_mobility(scale, rng):
+    countries = _countries(scale)
+    dates = _dates()
+    transport = ['driving', 'transit', 'walking']
+    df = pd.DataFrame({
+        'geo_type': 'country/region',
+        'region': np.repeat([c.name for c in countries], len(transport)),
+        'transportation_type': np.tile(transport, len(countries)),
+        'alternative_name': np.nan,
+        'sub-region': np.nan,
+        'country': np.nan,
+    })
+    values = pd.DataFrame(rng.random((len(df), len(dates))) * 200, columns=dates.strftime('%Y-%m-%d'))
+    df = pd.concat([df, values], axis=1)
+    index = {'basePath': _APPLE_APP_ROOT, 'regions': {'en-us': {'csvPath': _APPLE_CSV_PATH}}}
+    return {
+        apple._MOBILITY_INDEX: json.dumps(index).encode('utf-8'),
+        apple._BASE_URL + _APPLE_APP_ROOT + _APPLE_CSV_PATH: _csv(df),
+    }
+
+
+def _weeks(year, count):
+    first_monday = pd.Timestamp(f'{year}-01-01') + pd.offsets.Week(weekday=0)
+    return pd.date_range(first_monday, periods=count, freq='7D')
+
+
+def economist(scale, rng):
+    files = {}
+    for country in economist_excess_mortality.COUNTRIES:
+        name = country.replace('_', ' ').title()
+        starts = _weeks(2020, 40)
+        rows = []
+        for region in [name, f'{name} North']:
+            df = pd.DataFrame({
+                'country': name,
+                'region': region,
+                'region_code': 0,
+                'start_date': starts.strftime('%Y-%m-%d'),
+                'end_date': (starts + pd.Timedelta(days=6)).strftime('%Y-%m-%d'),
+                'year': 2020,
+                'month': starts.month,
+                'week': np.arange(1, len(starts) + 1),
+                'population': 10 ** 7,
+                'total_deaths': rng.integers(1000, 3000, len(starts)),
+                'covid_deaths': rng.integers(0, 500, len(starts)),
+                'expected_deaths': rng.integers(1000, 2500, len(starts)),
+            })
+            df['excess_deaths'] = df.total_deaths - df.expected_deaths
+            df['non_covid_deaths'] = df.total_deaths - df.covid_deaths
+            rows.append(df)
+        files[economist_excess_mortality.COUNTRY_PATH_FORMAT.format(country)] = _csv(pd.concat(rows))
+    return files
+
+
+def eurostat_mortality(scale, rng):
+    years, weeks = np.arange(2016, 2021), np.arange(1, 53)
+    index = pd.MultiIndex.from_product([_EUROSTAT_COUNTRIES, _EUROSTAT_AGES, _SEXES, years, weeks],
+                                       names=['GEO', 'AGE', 'SEX', 'YEAR', 'WEEK']).to_frame(index=False)
+    values = rng.integers(0, 3000, len(index))
+    df = pd.DataFrame({
+        'TIME': index.YEAR.astype(str) + 'W' + index.WEEK.map('{:02d}'.format),
+        'GEO': index.GEO,
+        'UNIT': 'Number',
+        'SEX': index.SEX,
+        'AGE': index.AGE,
+        'Value': pd.Series(values).map('{:,}'.format).where(rng.random(len(index)) > 0.05, ':'),
+        'Flag and Footnotes': np.nan,
+    })
+    return {eurostat._PATH: _csv(df)}
+
+
+def hmd_mortality(scale, rng):
+    countries = ['AUT', 'BEL', 'DNK', 'FIN', 'ESP', 'ISL', 'NLD', 'NOR', 'PRT', 'SWE', 'USA', 'DEUTNP']
+    index = pd.MultiIndex.from_product([countries, np.arange(2010, 2021), np.arange(1, 53), ['m', 'f', 'b']],
+                                       names=['CountryCode', 'Year', 'Week', 'Sex']).to_frame(index=False)
+    for column in ['D0_14', 'D15_64', 'D65_74', 'D75_84', 'D85p', 'DTotal']:
+        index[column] = rng.integers(0, 2000, len(index)).astype(float)
+    for column in ['R0_14', 'R15_64', 'R65_74', 'R75_84', 'R85p', 'RTotal']:
+        index[column] = rng.random(len(index))
+    index['Split'] = 0
+    index['SplitSex'] = 0
+    index['Forecast'] = 0
+    header = b'Short-Term Mortality Fluctuations\nSynthetic fixture\n'
+    return {hmd._PATH: header + _csv(index)}
+
+
+def _jh_wide(keys, dates, rng):
+    values = np.cumsum(rng.poisson(20, (len(keys), len(dates))), axis=1)
+    wide = pd.DataFrame(values, columns=dates.strftime('%-m/%-d/%y'))
+    return pd.concat([keys.reset_index(drop=True), wide], axis=1)
+
+
+def johns_hopkins_series(scale, rng):
+    countries = [c for c in _countries(scale) if c.alpha_3 != 'USA']
+    dates = _dates()
+    global_keys = pd.DataFrame({
+        'Province/State': [np.nan] * len(countries) + ['Province 1', 'Province 2'],
+        'Country/Region': [c.name for c in countries] + [countries[0].name] * 2,
+        'Lat': 0.0,
+        'Long': 0.0,
+    })
+    global_keys = pd.concat([global_keys, pd.DataFrame({
+        'Province/State': [np.nan], 'Country/Region': ['US'], 'Lat': [0.0], 'Long': [0.0]})])
+    states = [f'State {i}' for i in range(50)]
+    counties = pd.DataFrame({
+        'UID': np.arange(50 * 20),
+        'iso2': 'US',
+        'iso3': 'USA',
+        'code3': 840,
+        'FIPS': np.arange(50 * 20, dtype=float),
+        'Admin2': [f'County {i}' for i in range(50 * 20)],
+        'Province_State': np.repeat(states, 20),
+        'Country_Region': 'US',
+        'Lat': 0.0,
+        'Long_': 0.0,
+        'Combined_Key': 'County, State, US',
+    })
+    us_deaths_keys = counties.assign(Population=rng.integers(10 ** 3, 10 ** 6, len(counties)))
+
+    lookup = pd.DataFrame({
+        'UID': np.arange(len(global_keys) + len(states)),
+        'iso2': None,
+        'iso3': [c.alpha_3 for c in countries] + [countries[0].alpha_3] * 2 + ['USA'] * (1 + len(states)),
+        'code3': 0,
+        'FIPS': np.nan,
+        'Admin2': np.nan,
+        'Province_State': list(global_keys['Province/State']) + states,
+        'Country_Region': list(global_keys['Country/Region']) + ['US'] * len(states),
+        'Lat': 0.0,
+        'Long_': 0.0,
+        'Combined_Key': '',
+        'Population': rng.integers(10 ** 5, 10 ** 8, len(global_keys) + len(states)),
+    })
+    return {
+        johns_hopkins._JH_GLOBAL_CASES_PATH: _csv(_jh_wide(global_keys, dates, rng)),
+        johns_hopkins._JH_GLOBAL_DEATHS_PATH: _csv(_jh_wide(global_keys, dates, rng)),
+        # Upstream often publishes the US files a day after the global ones
+        johns_hopkins._JH_US_CASES_PATH: _csv(_jh_wide(counties, dates[:-1], rng)),
+        johns_hopkins._JH_US_DEATHS_PATH: _csv(_jh_wide(us_deaths_keys, dates[:-1], rng)),
+        johns_hopkins._JH_LOOKUP_PATH: _csv(lookup),
+    }
+
+
+def un_deaths(scale, rng):
+    countries = _countries(scale)
+    months = list(un_deaths_by_country.months) + ['Total', 'Unknown']
+    index = pd.MultiIndex.from_product([[c.name for c in countries], np.arange(2010, 2020), months],
+                                       names=['Country or Area', 'Year', 'Month']).to_frame(index=False)
+    index.insert(2, 'Area', 'Total')
+    index['Record Type'] = 'Data tabulated by year of occurrence'
+    index['Reliability'] = 'Final figure, complete'
+    index['Source Year'] = 2020
+    index['Value'] = rng.integers(100, 10 ** 5, len(index))
+    index['Value Footnotes'] = np.nan
+    return {un_deaths_by_country._DATA_PATH: _csv(index)}
+
+
+def weather_averages(scale, rng):
+    countries = _countries(scale)
+    dates = _dates()
+    df = pd.DataFrame({
+        'Date': np.tile(dates.strftime('%Y-%m-%d'), len(countries)),
+        'ISO': np.repeat([c.alpha_3 for c in countries], len(dates)),
+    })
+    for column in weather.COLUMN_NAMES:
+        df[column] = rng.random(len(df))
+    return {weather._PATH: _csv(df)}
+
+
+def yougov(scale, rng):
+    files = {}
+    rows = max(10, int(2000 * scale))
+    for i, country in enumerate(yougov_behavioural_tracker.COUNTRIES):
+        df = pd.DataFrame({
+            'RecordNo': np.arange(rows),
+            'endtime': '01/04/2020 12:00',
+            'qweek': 'week ' + pd.Series(rng.integers(1, 30, rows)).astype(str),
+            'i1_health': rng.integers(1, 11, rows),
+            'i2_health': rng.integers(1, 11, rows),
+            'region': 'Région' if i % 5 == 0 else 'Region',
+            'weight': rng.random(rows),
+        })
+        path = yougov_behavioural_tracker.COUNTRY_PATH_FORMAT.format(country.replace(' ', '-'))
+        # Some of the upstream files are not UTF-8
+        files[path] = df.to_csv(index=False).encode('cp1252' if i % 5 == 0 else 'utf-8')
+    return files
+
+
+def world_bank_api(scale, rng):
+    """World Bank API responses for the default indicators and years, and the country list."""
+    countries = _countries(scale)
+    names = [c.name for c in countries] + world_bank.AGGREGATES[:5]
+    codes = [c.alpha_3 for c in countries] + [f'A{i:02d}' for i in range(5)]
+    years = [str(y) for y in range(2020, 2009, -1)]
+
+    def _response(records):
+        return json.dumps([{'page': 1, 'pages': 1, 'per_page': 25000, 'total': len(records)}, records]).encode('utf-8')
+
+    files = {}
+    for indicator in world_bank.WORLD_BANK_INDICATORS.values():
+        values = rng.random((len(names), len(years))) * 100
+        missing = rng.random(values.shape) < 0.3
+        records = [
+            {
+                'indicator': {'id': indicator, 'value': indicator},
+                'country': {'id': code[:2], 'value': name},
+                'countryiso3code': code,
+                'date': year,
+                'value': None if missing[i, j] else float(values[i, j]),
+                'unit': '', 'obs_status': '', 'decimal': 1,
+            }
+            for i, (name, code) in enumerate(zip(names, codes)) for j, year in enumerate(years)
+        ]
+        url = world_bank._INDICATOR_URL_FORMAT.format(indicator=indicator, start=2010, end=2020)
+        files[url] = _response(records)
+
+    files[world_bank._COUNTRIES_URL] = _response([
+        {
+            'id': code, 'iso2Code': code[:2], 'name': name,
+            'region': {'id': 'NA', 'value': 'Aggregates'}, 'adminregion': {'id': '', 'value': ''},
+            'incomeLevel': {'id': 'NA', 'value': 'Aggregates'}, 'lendingType': {'id': '', 'value': 'Aggregates'},
+            'capitalCity': '', 'longitude': '', 'latitude': '',
+        }
+        for name, code in zip(names, codes)
+    ])
+    return files
+
+
+def acaps(scale, rng):
+    """
+    The ACAPS government measures workbook. Reports are named after their date, so the fixture is the report of two
+    days ago, and the loader has to probe the more recent dates first.
+    """
+    countries = _countries(scale)
+    rows = len(countries) * 40
+    measures = ['Schools closure', 'Border closure', 'Curfews', 'Lockdown', 'Limit public gatherings']
+    country = rng.integers(0, len(countries), rows)
+    df = pd.DataFrame({
+        'ID': np.arange(1, rows + 1),
+        'ISO': [countries[i].alpha_3 for i in country],
+        'COUNTRY': [countries[i].name for i in country],
+        'REGION': 'Region',
+        'ADMIN_LEVEL_NAME': np.nan,
+        'PCODE': np.nan,
+        'LOG_TYPE': 'Introduction / extension of measures',
+        'CATEGORY': 'Social distancing',
+        'MEASURE': rng.choice(measures, rows),
+        'TARGETED_POP_GROUP': 'No',
+        # Free text, with a few cells that Excel reads as numbers
+        'COMMENTS': np.where(rng.random(rows) < 0.1, rng.integers(1, 100, rows).astype(object), 'Measure comment'),
+        'NON_COMPLIANCE': np.nan,
+        # Dates, with a few cells entered as text
+        'DATE_IMPLEMENTED': np.where(rng.random(rows) < 0.05, 'Not specified', list(
+            pd.Timestamp(_START_DATE) + pd.to_timedelta(rng.integers(0, _DAYS, rows), unit='D'))),
+        'SOURCE': 'Government',
+        'SOURCE_TYPE': 'Government',
+        'LINK': 'https://example.org',
+        'ENTRY_DATE': pd.Timestamp(_START_DATE),
+        'Alternative source': np.nan,
+    })
+    workbook = io.BytesIO()
+    with pd.ExcelWriter(workbook) as writer:
+        df.to_excel(writer, sheet_name='Database', index=False)
+    return {acaps_government_measures._report_path(datetime.date.today() - datetime.timedelta(days=2)):
+            workbook.getvalue()}
+
+
+def _uk_area_days(areas, rng):
+    """Daily counts of every area, with the days without cases left out as in the published files."""
+    dates = _dates()
+    df = pd.DataFrame({'Area name': np.repeat(areas, len(dates)), 'date': np.tile(dates, len(areas))})
+    df['cases'] = rng.poisson(3, len(df)).astype(float)
+    df['tests'] = rng.poisson(40, len(df)).astype(float)
+    return df[df.cases > 0].reset_index(drop=True)
+
+
+def uk_areas(scale, rng):
+    """England and Wales daily counts by area, and Scotland cumulative counts by health board."""
+    england = _uk_area_days([f'Area {i}' for i in range(max(5, int(round(_UK_AREAS * scale))))], rng)
+    england = pd.DataFrame({
+        'Area name': england['Area name'],
+        'Area code': 'E' + england['Area name'].str.slice(5).str.zfill(8),
+        'Area type': np.where(rng.random(len(england)) < 0.5, 'utla', 'ltla'),
+        'Specimen date': england.date.dt.strftime('%Y-%m-%d'),
+        'Daily lab-confirmed cases': england.cases.astype(int),
+    })
+
+    wales = _uk_area_days([f'Authority {i}' for i in range(22)], rng)
+    wales = pd.DataFrame({
+        'Local Authority': wales['Area name'],
+        'Specimen date': wales.date,
+        'Cases (new)': wales.cases.astype(int),
+        'Testing episodes (new)': wales.tests.astype(int),
+    })
+    workbook = io.BytesIO()
+    with pd.ExcelWriter(workbook) as writer:
+        wales.to_excel(writer, sheet_name='Tests by specimen date', index=False)
+
+    boards = [f'NHS Board {i}' for i in range(14)]
+    scotland = pd.DataFrame(np.cumsum(rng.poisson(5, (_DAYS, len(boards))), axis=0), columns=boards).astype(object)
+    scotland[rng.random(scotland.shape) < 0.02] = '*'
+    scotland.insert(0, 'Date', _dates().strftime('%Y-%m-%d'))
+
+    return {
+        uk_area_stats.ENGLAND_CASES_PATH: _csv(england),
+        uk_area_stats.WALES_PATH: workbook.getvalue(),
+        uk_area_stats.SCOTLAND_PATH: _csv(scotland),
+    }
+
+
+def country_aliases(scale, rng):
+    """The alias table used for country name resolution is served as is."""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'cia_country_iso_mapping.csv')
+    with open(path, 'rb') as f:
+        return {utils._COUNTRY_ALIASES_PATH: f.read()}
+
+
+SOURCES = {
+    'owid': owid,
+    'oxford': oxford,
+    'masks': masks,
+    'google_mobility': google_mobility,
+    'apple_mobility': apple_mobility,
+    'economist': economist,
+    'eurostat': eurostat_mortality,
+    'hmd': hmd_mortality,
+    'johns_hopkins': johns_hopkins_series,
+    'un_deaths': un_deaths,
+    'weather': weather_averages,
+    'yougov': yougov,
+    'world_bank': world_bank_api,
+    'acaps': acaps,
+    'uk_area_stats': uk_areas,
+    'country_aliases': country_aliases,
+}
+
+
+def source_files(scale: float = 1.0, seed: int = 0) -> dict:
+    """
+    Returns the fixture files of every source as {source name: {source URL: bytes}}.
+    """
+    return {name: make(scale, np.random.default_rng(seed)) for name, make in SOURCES.items()}
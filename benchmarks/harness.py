@@ -0,0 +1,97 @@
+"""
+Timing, memory measurement and baseline comparison for the benchmarks.
+"""
+
+import json
+import time
+import tracemalloc
+
+import pandas as pd
+
+
+def checksum(result) -> str:
+    """
+    Returns a checksum of a benchmark result, so that changes in output are caught along with changes in speed.
+    """
+    if isinstance(result, pd.Series):
+        result = result.to_frame()
+    if isinstance(result, pd.DataFrame):
+        hashes = pd.util.hash_pandas_object(result, index=True)
+        return f'{len(result)}:{int(hashes.sum()) % 2 ** 64:016x}'
+    if isinstance(result, dict):
+        return ','.join(f'{k}={checksum(v)}' for k, v in sorted(result.items()))
+    return ''
+
+
+def _rows(result):
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    if isinstance(result, dict):
+        return sum(_rows(v) for v in result.values())
+    return None
+
+
+class Benchmark:
+    """
+    Collects timings of named stages.
+    """
+
+    def __init__(self, repeat: int = 1, memory: bool = False):
+        """
+        :param repeat: Number of times each stage is run, the fastest run is reported
+        :param memory: If true, measure peak memory with tracemalloc (which slows everything down)
+        """
+        self.repeat = repeat
+        self.memory = memory
+        self.results = {}
+
+    def run(self, name: str, func, *args, **kwargs):
+        """
+        Times a stage, records its result and returns the output of its last run.
+        """
+        timings = []
+        peak = None
+        for _ in range(self.repeat):
+            if self.memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            timings.append(time.perf_counter() - start)
+            if self.memory:
+                peak = max(peak or 0, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+
+        self.results[name] = {
+            'seconds': min(timings),
+            'peak_bytes': peak,
+            'rows': _rows(result),
+            'checksum': checksum(result),
+        }
+        print(f'{name:<50} {min(timings):>9.3f}s' + (f' {peak / 2 ** 20:>9.1f}MB' if peak else ''))
+        return result
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.results, f, indent=2, sort_keys=True)
+
+    def compare(self, baseline_path: str, tolerance: float = 1.25) -> list:
+        """
+        Compare results with a stored baseline.
+        Returns a list of problems: stages that got slower than tolerance times the baseline, or whose output changed.
+        """
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)
+
+        problems = []
+        for name, result in self.results.items():
+            if name not in baseline:
+                continue
+            expected = baseline[name]
+            ratio = result['seconds'] / max(expected['seconds'], 1e-9)
+            if ratio > tolerance:
+                problems.append(f'{name}: {ratio:.2f}x slower than baseline')
+            if expected['checksum'] != result['checksum']:
+                problems.append(f'{name}: output differs from baseline')
+            if result['peak_bytes'] and expected.get('peak_bytes') and result['peak_bytes'] > tolerance * expected['peak_bytes']:
+                problems.append(f'{name}: peak memory {result["peak_bytes"] / expected["peak_bytes"]:.2f}x baseline')
+        return problems
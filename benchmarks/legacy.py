@@ -0,0 +1,281 @@
+"""
+Previous implementations of optimised code paths, kept to benchmark and check the replacements against.
+"""
+
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import pycountry
+
+from covid19_datasets.constants import ISO_COLUMN_NAME, DATE_COLUMN_NAME
+from covid19_datasets import (cache, combined, economist_excess_mortality, johns_hopkins, mobility, our_world_in_data,
+                              uk_area_stats, yougov_behavioural_tracker)
+
+
+def _owid_fill_gaps(series, ffill=True):
+    series = series.copy()
+    non_nans = series[~series.apply(np.isnan)]
+
+    if non_nans.empty:
+        return series
+
+    start, end = non_nans.index[0], non_nans.index[-1]
+    if ffill:
+        series.loc[start:end] = series.loc[start:end].fillna(method='ffill')
+    else:
+        series.loc[start:end] = series.loc[start:end].fillna(0.)
+    return series
+
+
+def _owid_fill_group_dates(rows):
+    rows = rows.set_index(DATE_COLUMN_NAME)
+    rows = rows.reindex(pd.date_range(rows.index.min(), rows.index.max(), freq='D'))
+
+    rows.loc[:, our_world_in_data._FILL_COLUMNS] = rows.loc[:, our_world_in_data._FILL_COLUMNS].ffill().bfill()
+    for col in our_world_in_data._FFILL_GAPS_COLUMNS:
+        rows.loc[:, col] = _owid_fill_gaps(rows.loc[:, col], ffill=True)
+    for col in our_world_in_data._ZERO_FILL_GAPS_COLUMNS:
+        rows.loc[:, col] = _owid_fill_gaps(rows.loc[:, col], ffill=False)
+
+    return rows.drop(ISO_COLUMN_NAME, axis='columns')
+
+
+def owid_fill_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """OWID gap filling with a Python function applied to every country."""
+    return (df.groupby(ISO_COLUMN_NAME)
+            .apply(_owid_fill_group_dates)
+            .reset_index()
+            .rename(columns={'level_1': DATE_COLUMN_NAME}))
+
+
+def _owid_compute_anchor(col: str) -> Callable[[pd.DataFrame], pd.Timestamp]:
+    def _apply(rows: pd.DataFrame) -> pd.Timestamp:
+        anchor = rows.query(f'{col} > 0')
+        if len(anchor) > 0:
+            anchor = anchor.iloc[0].DATE
+        else:
+            anchor = rows.DATE.max()
+        return anchor
+    return _apply
+
+
+def owid_add_days_since(df: pd.DataFrame) -> pd.DataFrame:
+    """OWID days since first case and death, with a query per country."""
+    first_cases = df.groupby('ISO').apply(_owid_compute_anchor('total_cases')).reset_index().rename(columns={0: 'first_case'})
+    first_deaths = df.groupby('ISO').apply(_owid_compute_anchor('total_deaths')).reset_index().rename(columns={0: 'first_death'})
+    df = df.merge(first_cases, on='ISO').merge(first_deaths, on='ISO')
+    df['days_since_first_case'] = (df.DATE - df.first_case).dt.days
+    df['days_since_first_death'] = (df.DATE - df.first_death).dt.days
+    df = df.drop(['first_case', 'first_death'], axis='columns')
+    return df
+
+
+def get_country_iso(country_name):
+    """Country name resolution with pycountry lookups and a fuzzy search for every name."""
+    country = pycountry.countries.get(name=country_name)
+    if country is not None:
+        return country.alpha_3
+
+    country = pycountry.countries.get(official_name=country_name)
+    if country is not None:
+        return country.alpha_3
+
+    try:
+        country = pycountry.countries.search_fuzzy(country_name)[0]
+        return country.alpha_3
+    except LookupError:
+        return None
+
+
+def mobility_load_dataset():
+    """Google mobility report loaded whole, then filtered to countries."""
+    raw = cache.read_csv(mobility._MOBILITY_PATH)
+    mob_rep_data = raw.rename(columns={'date': DATE_COLUMN_NAME})
+    mob_rep_data[DATE_COLUMN_NAME] = pd.to_datetime(mob_rep_data[DATE_COLUMN_NAME])
+    mob_rep_data = mob_rep_data[(mob_rep_data["sub_region_1"].isnull()) & (mob_rep_data["metro_area"].isnull())]
+    mob_rep_data = mob_rep_data.rename(columns=mobility.COLUMN_NAMES)
+    mob_rep_data = mob_rep_data.drop(['sub_region_1', 'sub_region_2', 'country_region'], axis=1)
+    mob_rep_data = mob_rep_data.dropna(subset=['country_region_code'])
+
+    mob_rep_data[ISO_COLUMN_NAME] = mob_rep_data.country_region_code.apply(lambda c: pycountry.countries.get(alpha_2=c).alpha_3)
+
+    mob_rep_data = mob_rep_data.drop('country_region_code', axis='columns')
+    return mob_rep_data
+
+
+def _jh_standardise(ts_df: pd.DataFrame, label: str) -> pd.DataFrame:
+    long_df = (ts_df
+               .rename(columns=johns_hopkins._RENAME_COLS)
+               .melt(id_vars=johns_hopkins._KEY_COLUMNS, var_name=DATE_COLUMN_NAME, value_name=f'total_{label}'))
+
+    long_df.DATE = pd.to_datetime(long_df.DATE, format='%m/%d/%y')
+    long_df = long_df.rename(columns={'iso3': ISO_COLUMN_NAME})
+
+    return long_df
+
+
+def johns_hopkins_load_dataset() -> pd.DataFrame:
+    """Johns Hopkins time series melted to long format, then merged."""
+    jh = johns_hopkins
+    jh_global_cases = cache.read_csv(jh._JH_GLOBAL_CASES_PATH)
+    jh_us_cases = cache.read_csv(jh._JH_US_CASES_PATH)
+    jh_global_deaths = cache.read_csv(jh._JH_GLOBAL_DEATHS_PATH)
+    jh_us_deaths = cache.read_csv(jh._JH_US_DEATHS_PATH)
+    jh_lookup = cache.read_csv(jh._JH_LOOKUP_PATH)
+
+    jh_lookup = jh_lookup[jh_lookup.Admin2.isna()]
+
+    jh_cases = _jh_standardise(jh_global_cases.drop(jh._DROP_GLOBAL_COLUMNS, axis='columns'), 'cases')
+    jh_deaths = _jh_standardise(jh_global_deaths.drop(jh._DROP_GLOBAL_COLUMNS, axis='columns'), 'deaths')
+
+    us_cases = _jh_standardise(jh._convert_us_data(jh_us_cases), 'cases')
+    us_deaths = _jh_standardise(jh._convert_us_data(jh_us_deaths), 'deaths')
+    us_data = us_cases.merge(us_deaths, on=jh._KEY_COLUMNS + [DATE_COLUMN_NAME])
+
+    jh_data = jh_cases.merge(jh_deaths, on=jh._KEY_COLUMNS + [DATE_COLUMN_NAME])
+    jh_data = jh_data.query('Country_Region != "US"')
+    jh_data = pd.concat([jh_data, us_data], axis=0)
+    jh_data = jh_data.merge(jh_lookup[jh._LOOKUP_COLUMNS + jh._KEY_COLUMNS], on=jh._KEY_COLUMNS, how='inner')
+
+    return jh_data
+
+
+def _uk_backfill_missing_data(df):
+    df = df.fillna(0.0)
+    all_days = pd.date_range(df.columns.min(), df.columns.max(), freq='D')
+    missing_days = np.setdiff1d(all_days, df.columns)
+    for missing_day in missing_days:
+        df[missing_day] = 0.0
+    return df[np.sort(df.columns)]
+
+
+def uk_cases_data(area_type: str) -> pd.DataFrame:
+    """UK cases by area, with dates completed one column at a time and Scotland differenced column by column."""
+    england = cache.read_csv(uk_area_stats.ENGLAND_CASES_PATH)
+    england[DATE_COLUMN_NAME] = pd.to_datetime(england['Specimen date'].astype(str))
+    england['Daily lab-confirmed cases'] = england['Daily lab-confirmed cases'].astype('float')
+    england = england[england['Area type'] == area_type]
+    england['Country'] = 'England'
+    england = _uk_backfill_missing_data(england.pivot_table(
+        index=['Country', 'Area name'], columns=DATE_COLUMN_NAME, values='Daily lab-confirmed cases'))
+
+    wales = pd.read_excel(pd.ExcelFile(cache.fetch(uk_area_stats.WALES_PATH)), 'Tests by specimen date')
+    wales['Cases (new)'] = wales['Cases (new)'].astype('float')
+    wales[DATE_COLUMN_NAME] = pd.to_datetime(wales['Specimen date'].astype(str))
+    wales['Country'] = 'Wales'
+    wales = wales.rename(columns={'Local Authority': 'Area name'})
+    wales = _uk_backfill_missing_data(wales.pivot_table(
+        index=['Country', 'Area name'], columns=DATE_COLUMN_NAME, values='Cases (new)'))
+
+    scotland = cache.read_csv(uk_area_stats.SCOTLAND_PATH).transpose()
+    new_header = scotland.iloc[0]
+    scotland = scotland[1:]
+    scotland.columns = pd.to_datetime(new_header.astype(str))
+    scotland.columns.name = None
+    scotland = scotland.replace('*', 0.0).astype(float)
+    for i in range(len(scotland.columns) - 1, 1, -1):
+        scotland.iloc[:, i] = scotland.iloc[:, i] - scotland.iloc[:, i-1]
+    scotland['Country'] = 'Scotland'
+    scotland = scotland.reset_index().rename(columns={'index': 'Area name'}).set_index(['Country', 'Area name'])
+
+    return pd.concat([england, wales, scotland]).fillna(0.0)
+
+
+def _weekly_resample(grouped_df):
+    min_date = grouped_df.DATE.min() - pd.offsets.Day(6)
+    max_date = grouped_df.DATE.max()
+    grouped = grouped_df.set_index('DATE').reindex(pd.date_range(min_date, max_date, freq='D'))
+    grouped.loc[:, 'deaths_excess_daily_avg'] = grouped.loc[:, 'deaths_excess_daily_avg'].bfill(limit=7)
+    return grouped
+
+
+def eurostat_daily(df: pd.DataFrame) -> pd.DataFrame:
+    """EuroStat weekly excess mortality expanded to days group by group."""
+    df = df.copy()
+    df['deaths_excess_daily_avg'] = df['deaths_excess_weekly'] / 7
+    key_columns = ['country', 'AGE', 'SEX', 'ISO']
+    return (df
+            .groupby(key_columns)
+            .apply(_weekly_resample)
+            .drop(key_columns, axis='columns')
+            .reset_index()
+            .rename(columns={'level_4': DATE_COLUMN_NAME}))
+
+
+def economist_daily(df: pd.DataFrame) -> pd.DataFrame:
+    """The Economist weekly country data expanded to days country by country."""
+    df = df[df['country'] == df['region']].drop(['region', 'region_code'], axis='columns')
+    df[DATE_COLUMN_NAME] = df['start_date']
+
+    def _resample_start_to_end(country_df):
+        last_row = pd.DataFrame(country_df[-1:].values, columns=country_df.columns)
+        last_row[DATE_COLUMN_NAME] = country_df['end_date'].max()
+        country_df = country_df.append(last_row)
+        return country_df.set_index(DATE_COLUMN_NAME).resample('D').ffill()
+
+    df = df.set_index('country').groupby('country').apply(_resample_start_to_end).reset_index()
+    df['deaths_excess_weekly'] = df.apply(
+        lambda row: row['excess_deaths'] if row['end_date'] == row[DATE_COLUMN_NAME] else np.NaN, axis=1)
+    df = df.drop(['start_date', 'end_date'], axis='columns')
+    # Rows appended with .values make every column object
+    return df.rename(columns=economist_excess_mortality.COLUMN_NAMES).infer_objects()
+
+
+def oxford_all_policy_changes(data: pd.DataFrame) -> dict:
+    """Policy changes of every country, querying the whole frame for each country."""
+    changes = {}
+    for iso in data[ISO_COLUMN_NAME].unique():
+        country_df = data.query(f'CountryName == "{iso}" or ISO == "{iso}"').set_index(DATE_COLUMN_NAME)
+        country_df = country_df.drop(['ConfirmedCases', 'ConfirmedDeaths'], axis='columns')
+        changes[iso] = ((country_df != country_df.shift(1)) & ~country_df.isna()).iloc[1:]
+    return changes
+
+
+def yougov_load_dataset() -> pd.DataFrame:
+    """YouGov countries read one after the other, retrying with another encoding when a file is not UTF-8."""
+    all_data = []
+    for country in yougov_behavioural_tracker.COUNTRIES:
+        path = yougov_behavioural_tracker.COUNTRY_PATH_FORMAT.format(country.replace(' ', '-'))
+        try:
+            country_df = cache.read_csv(path)
+        except UnicodeDecodeError:
+            country_df = cache.read_csv(path, encoding='cp1252')
+        country_df['country'] = country
+        all_data.append(country_df)
+    return pd.concat(all_data, axis=0)
+
+
+def combined_select(data: pd.DataFrame, isos: list, start, end, columns: list = None) -> pd.DataFrame:
+    """Rows of the combined dataset selected with boolean masks over the index levels."""
+    dates = data.index.get_level_values(DATE_COLUMN_NAME)
+    mask = (data.index.get_level_values(ISO_COLUMN_NAME).isin(isos)
+            & (dates >= pd.Timestamp(start)) & (dates <= pd.Timestamp(end)))
+    selected = data[mask]
+    return selected if columns is None else selected[columns]
+
+
+def combined_merge(sources: dict) -> pd.DataFrame:
+    """Combined dataset built with a chain of left merges on the ISO and DATE columns."""
+    interventions_data = (sources['policies']
+                          .merge(sources['masks'], on=[ISO_COLUMN_NAME, DATE_COLUMN_NAME], how='left')
+                          .set_index([ISO_COLUMN_NAME, DATE_COLUMN_NAME]))
+    interventions_data['npi_masks'] = (interventions_data['npi_masks']
+                                       .groupby(level=0)
+                                       .ffill()
+                                       .fillna(0.))
+    interventions_data = interventions_data.reset_index()
+    country_name_map = {
+        iso: combined.country_name_from_iso(iso)
+        for iso in interventions_data[ISO_COLUMN_NAME].unique()
+    }
+    interventions_data.insert(0, 'country_name', interventions_data[ISO_COLUMN_NAME].replace(country_name_map))
+
+    data = interventions_data
+    for name in combined._SOURCES:
+        if name in sources and name not in combined._BASE_SOURCES:
+            keys = [ISO_COLUMN_NAME] if name in combined._STATIC_SOURCES else [ISO_COLUMN_NAME, DATE_COLUMN_NAME]
+            data = data.merge(sources[name], on=keys, how='left')
+    data = data.set_index([ISO_COLUMN_NAME, DATE_COLUMN_NAME])
+    combined._check_index(data)
+    return data
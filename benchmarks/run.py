@@ -0,0 +1,63 @@
+"""
+Run the offline benchmarks.
+
+    python benchmarks/run.py --scale 0.1
+    python benchmarks/run.py --save-baseline
+    python benchmarks/run.py --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import Benchmark  # noqa: E402
+
+
+# Suites are imported on demand, the generator needs the optional PDF and HTML parsing dependencies
+SUITES = {
+    'combined': 'bench_combined',
+    'generator': 'bench_generator',
+    'kernels': 'bench_kernels',
+}
+
+_DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the offline benchmarks')
+    parser.add_argument('suites', nargs='*', help='Suites to run, all if none given')
+    parser.add_argument('--scale', type=float, default=1.0, help='Fixture size relative to the real sources')
+    parser.add_argument('--repeat', type=int, default=1, help='Run each stage this many times and keep the fastest')
+    parser.add_argument('--memory', action='store_true', help='Measure peak memory of each stage')
+    parser.add_argument('--baseline', default=_DEFAULT_BASELINE, help='Baseline to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='Allowed slowdown relative to the baseline')
+    args = parser.parse_args()
+
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f'Unknown suites: {", ".join(sorted(unknown))}')
+
+    logging.basicConfig(level=logging.WARNING)
+    bench = Benchmark(repeat=args.repeat, memory=args.memory)
+    for name in args.suites or SUITES:
+        importlib.import_module(SUITES[name]).run(bench, args.scale)
+
+    if args.save_baseline:
+        bench.save(args.baseline)
+        print(f'Saved baseline to {args.baseline}')
+    elif os.path.exists(args.baseline):
+        problems = bench.compare(args.baseline, tolerance=args.tolerance)
+        for problem in problems:
+            print(problem)
+        if problems:
+            sys.exit(1)
+        print('No regressions against baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Local HTTP stand-in for the upstream data sources.
+
+Serves fixture files at the quoted source URL, which is the layout expected by
+covid19_datasets.cache when a mirror is configured. Supports HEAD requests
+and ETag revalidation so cache behaviour can be exercised offline.
+"""
+
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+
+class FixtureServer:
+    """
+    Serves a dictionary of {source URL: bytes} on localhost.
+
+    Use as a context manager:
+        with FixtureServer(files) as server:
+            cache.configure(mirror=server.url)
+    """
+
+    def __init__(self, files: dict):
+        self.files = dict(files)
+        self.bytes_sent = 0
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f'http://{host}:{port}/'
+
+    def _handler(self):
+        fixture_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, send_body):
+                content = fixture_server.files.get(unquote(self.path.lstrip('/')))
+                if content is None:
+                    self.send_error(404)
+                    return
+                etag = '"' + hashlib.sha1(content).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(content)
+                    fixture_server.bytes_sent += len(content)
+
+            def do_GET(self):
+                self._respond(send_body=True)
+
+            def do_HEAD(self):
+                self._respond(send_body=False)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
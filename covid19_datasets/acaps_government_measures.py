@@ -1,44 +1,142 @@
 import pandas as pd
+import contextlib
 import datetime
-from urllib.error import HTTPError
+import glob
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from . import cache, instrumentation
 
 import logging
 _log = logging.getLogger(__name__)
 
 
-def _load_dataset():
-    
-    acaps_path = 'https://www.acaps.org/sites/acaps/files/resources/files/{date}_acaps_-_covid-19_goverment_measures_dataset_v10.xlsx'
+_ACAPS_PATH = 'https://www.acaps.org/sites/acaps/files/resources/files/{date}_acaps_-_covid-19_goverment_measures_dataset_v10.xlsx'
+# an absolutely last resort, but it is probably better to retrieve some data if we can
+# this is written on 26.04.2020, and the last available report is dated 23.04.2020
+_LAST_KNOWN_DATE = datetime.date(2020, 4, 23)
+_PARSED_DIRNAME = 'acaps'
+_DROP_COLUMNS = ['ADMIN_LEVEL_NAME', 'PCODE', 'SOURCE', 'SOURCE_TYPE', 'LINK', 'ENTRY_DATE', 'Alternative source']
+_DATE_COLUMNS = ['DATE_IMPLEMENTED']
+
 
+def _dates_to_try() -> list:
     # the file path depends on the exact day, and some are known to be missing
     # therefore compile a list of dates to try, and then fall if none worked
+    today = datetime.date.today()
+    return [today, today - datetime.timedelta(days=1), today - datetime.timedelta(days=2),
+            today - datetime.timedelta(weeks=1), _LAST_KNOWN_DATE]
+
+
+def _report_path(date) -> str:
+    return _ACAPS_PATH.format(date=date.strftime('%Y%m%d'))
+
+
+def _parsed_path(date, digest: str) -> str:
+    # Keyed on the content of the report too, as a report may be published again under the same date
+    return os.path.join(cache.cache_dir(), _PARSED_DIRNAME, f'{date.strftime("%Y%m%d")}_{digest}.parquet')
+
+
+def _parsed_reports(date) -> list:
+    """Returns the reports of a date parsed before, most recent first."""
+    paths = glob.glob(_parsed_path(date, '*'))
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def _report_date():
+    """
+    Returns the date of the most recent report, probing all dates at once without downloading the reports.
+    When no report can be reached, falls back to the most recent report parsed before.
+    """
+    dates = _dates_to_try()
+    with ThreadPoolExecutor(max_workers=len(dates)) as executor:
+        available = list(executor.map(lambda date: cache.exists(_report_path(date)), dates))
+
+    for date, report_exists in zip(dates, available):
+        if report_exists:
+            return date
+        _log.info("No report on " + str(date))
+
+    for date in dates:
+        if _parsed_reports(date):
+            _log.warning(f'No ACAPS report could be reached, using the report of {date} parsed before')
+            return date
+
+    error_message = 'ACAPS report unavailable'
+    _log.error(error_message)
+    raise RuntimeError(error_message)
+
 
-    today = datetime.datetime.today()
-    yesterday = today - datetime.timedelta(days=1)
-    two_days_ago = today - datetime.timedelta(days=2)
-    week_ago = today - datetime.timedelta(weeks=1)
-    # an absolutely last resort, but it is probably better to retrieve some data if we can
-    # this is written on 26.04.2020, and the last available report is dated 23.04.2020
-    last_known_date = datetime.date(2020, 4, 23)
-    days_to_try = [today, yesterday, two_days_ago, week_ago, last_known_date]
-
-    for date in days_to_try:
-        path = acaps_path.format(date=date.strftime('%Y%m%d'))
-        try:
-            _log.info("Loading dataset from " + path)
-            acaps_df = pd.read_excel(path, sheet_name='Database')
-        except HTTPError:
-            _log.info("No report on " + str(date))
-            continue
-        else:
-            break
-    else:
-        error_message = 'ACAPS report unavailable'
-        _log.error(error_message)
-        raise RuntimeError(error_message)
+def _columnar(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Text columns of the workbook may have some cells read as numbers or dates.
+    Store all non-missing values of such columns as strings, so that the columns can be written to parquet.
+    Date columns may have some cells read as text, they are converted to dates, and unparseable cells dropped to NaT.
+    """
+    for column in _DATE_COLUMNS:
+        df[column] = pd.to_datetime(df[column], errors='coerce')
+    for column in df.columns[df.dtypes == object]:
+        values = df[column].dropna()
+        if not values.map(lambda v: isinstance(v, str)).all():
+            df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+    return df
+
+
+def _read_workbook(path) -> pd.DataFrame:
+    acaps_df = pd.read_excel(path, sheet_name='Database')
+    return acaps_df.drop(_DROP_COLUMNS, axis='columns')
+
+
+@instrumentation.instrumented()
+def _parse_report(date) -> pd.DataFrame:
+    """
+    Reads the Database sheet of a report. The sheet is parsed once per version of the report and kept in the cache
+    directory as parquet, so later loads skip Excel parsing.
+    To be written to parquet, DATE_IMPLEMENTED is converted to dates, with NaT for the cells that are not dates,
+    and the other columns mixing text with numbers or dates are converted to text.
+    With the cache disabled, the sheet is returned as Excel parsing gives it.
+    """
+    path = _report_path(date)
+    _log.info("Loading dataset from " + path)
+    if not cache.enabled():
+        return _read_workbook(cache.source_url(path))
+
+    try:
+        local_path = cache.fetch(path)
+    except URLError:
+        parsed_reports = _parsed_reports(date)
+        if not parsed_reports:
+            raise
+        _log.warning(f'Could not download the report of {date}, using the version parsed before')
+        return pd.read_parquet(parsed_reports[0])
+
+    # Blobs are named after the hash of their content
+    parsed_path = _parsed_path(date, os.path.basename(local_path))
+    if os.path.exists(parsed_path):
+        _log.info(f'Using parsed report of {date}')
+        return pd.read_parquet(parsed_path)
+
+    acaps_df = _columnar(_read_workbook(local_path))
+    os.makedirs(os.path.dirname(parsed_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(parsed_path), suffix='.tmp')
+    os.close(fd)
+    acaps_df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, parsed_path)
+
+    # Earlier versions of the report are not needed anymore
+    for previous_path in _parsed_reports(date):
+        if previous_path != parsed_path:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(previous_path)
+    return acaps_df
+
+
+@instrumentation.instrumented()
+def _load_dataset():
+    acaps_df = _parse_report(_report_date())
 
     # Clean-up
-    acaps_df = acaps_df.drop(['ADMIN_LEVEL_NAME', 'PCODE', 'SOURCE', 'SOURCE_TYPE', 'LINK', 'ENTRY_DATE', 'Alternative source'], axis='columns')
     acaps_df = acaps_df.rename(columns={'DATE_IMPLEMENTED': 'DATE'})
     _log.info("Loaded")
     return acaps_df
@@ -67,7 +165,9 @@ class AcapsGovernmentMeasures:
 
     def get_data(self):
         """
-        Returns the dataset as Pandas dataframe
+        Returns the dataset as Pandas dataframe.
+        When read through the cache, DATE is a datetime column and the text columns only hold strings,
+        see _parse_report.
         """
         return AcapsGovernmentMeasures.data
     
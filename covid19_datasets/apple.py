@@ -4,8 +4,8 @@ import datetime
 import logging
 
 from .constants import *
-import requests
-from .utils import get_country_iso
+from . import cache, instrumentation
+from .utils import country_isos
 _log = logging.getLogger(__name__)
 
 
@@ -19,13 +19,14 @@ COLUMN_NAMES = {
 }
 
 
+@instrumentation.instrumented()
 def _load_dataset():
-  json = requests.get(_MOBILITY_INDEX).json()
+  json = cache.read_json(_MOBILITY_INDEX)
   base_path = json['basePath']
   filename = json['regions']['en-us']['csvPath']
   path = _BASE_URL + base_path + filename
   _log.info(f'Loading Apple Mobility data from {path}')
-  df = pd.read_csv(path)
+  df = cache.read_csv(path)
   return df
 
 
@@ -67,12 +68,7 @@ class AppleMobility():
 
         df[DATE_COLUMN_NAME] = pd.to_datetime(df[DATE_COLUMN_NAME])
 
-        iso_map = {
-            country_name: get_country_iso(country_name)
-            for country_name in df.region.unique()
-        }
-
-        df.region = df.region.replace(iso_map)
+        df.region = country_isos(df.region)
         df = df.rename(columns={'region': ISO_COLUMN_NAME})
         df = (df
               .set_index([ISO_COLUMN_NAME, DATE_COLUMN_NAME, 'transportation_type'])
@@ -0,0 +1,320 @@
+"""
+Persistent on-disk cache for downloaded source files.
+
+Every loader fetches its source files through this module. Files are stored
+once per content hash and indexed by URL. Within the TTL a cached file is used
+without contacting the server. After that it is revalidated with
+ETag/Last-Modified, so an unchanged upstream file is not downloaded again.
+The cache is bounded in size and evicts the least recently used files first.
+
+Settings can be changed with `configure` or via environment variables:
+    COVID19_DATASETS_CACHE_DIR: cache location (default ~/.cache/covid19_datasets)
+    COVID19_DATASETS_CACHE_TTL: seconds before a cached file is revalidated (default 3600)
+    COVID19_DATASETS_CACHE_MAX_SIZE: maximum cache size in bytes (default 4GB)
+    COVID19_DATASETS_MIRROR: base URL of a mirror serving every source file (default none)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+import pandas as pd
+
+from . import instrumentation
+
+import logging
+_log = logging.getLogger(__name__)
+
+
+_INDEX_FILENAME = 'index.json'
+_BLOBS_DIRNAME = 'blobs'
+_CHUNK_SIZE = 1024 * 1024
+_USER_AGENT = 'Mozilla/5.0'
+# Files in the blob store but not in the index are removed once this old, newer ones may be about to be indexed
+_ORPHAN_AGE = 60
+
+_settings = {
+    'cache_dir': os.environ.get(
+        'COVID19_DATASETS_CACHE_DIR',
+        os.path.join(os.path.expanduser('~'), '.cache', 'covid19_datasets')),
+    'ttl': float(os.environ.get('COVID19_DATASETS_CACHE_TTL', 3600)),
+    'max_size': int(os.environ.get('COVID19_DATASETS_CACHE_MAX_SIZE', 4 * 1024 ** 3)),
+    'enabled': True,
+    'mirror': os.environ.get('COVID19_DATASETS_MIRROR'),
+}
+
+# Guards the index file; loaders may fetch from several threads at once
+_lock = threading.RLock()
+
+
+def configure(cache_dir=None, ttl=None, max_size=None, enabled=None, mirror=None):
+    """
+    Change the cache settings for this session.
+
+    :param cache_dir: Directory where cached files are stored
+    :param ttl: Seconds during which a cached file is used without revalidation
+    :param max_size: Maximum total size of cached files in bytes
+    :param enabled: If false, loaders read directly from the source URLs
+    :param mirror: Base URL of a mirror serving every source file, with the quoted source URL as path.
+                   Used to run loaders against a local stand-in. An empty string removes the mirror.
+    """
+    if cache_dir is not None:
+        _settings['cache_dir'] = cache_dir
+    if ttl is not None:
+        _settings['ttl'] = float(ttl)
+    if max_size is not None:
+        _settings['max_size'] = int(max_size)
+    if enabled is not None:
+        _settings['enabled'] = enabled
+    if mirror is not None:
+        _settings['mirror'] = mirror or None
+
+
+def enabled() -> bool:
+    """
+    Returns whether loaders read through the cache.
+    """
+    return _settings['enabled']
+
+
+def source_url(url: str) -> str:
+    """
+    Returns the URL a file is actually fetched from, taking the mirror setting into account.
+    """
+    if _settings['mirror'] is None:
+        return url
+    return _settings['mirror'].rstrip('/') + '/' + quote(url, safe='')
+
+
+def cache_dir() -> str:
+    """
+    Returns the cache directory, creating it if needed.
+    """
+    os.makedirs(os.path.join(_settings['cache_dir'], _BLOBS_DIRNAME), exist_ok=True)
+    return _settings['cache_dir']
+
+
+def _index_path():
+    return os.path.join(cache_dir(), _INDEX_FILENAME)
+
+
+def _blob_path(digest):
+    return os.path.join(cache_dir(), _BLOBS_DIRNAME, digest)
+
+
+def _read_index():
+    try:
+        with open(_index_path(), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_index(index):
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir(), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, _index_path())
+
+
+def _blob_files() -> dict:
+    """Returns the stat of every file in the blob store, by hash."""
+    files = {}
+    with os.scandir(os.path.join(cache_dir(), _BLOBS_DIRNAME)) as entries:
+        for entry in entries:
+            try:
+                files[entry.name] = entry.stat()
+            except FileNotFoundError:
+                pass
+    return files
+
+
+def _remove_blob(digest):
+    try:
+        os.remove(_blob_path(digest))
+    except FileNotFoundError:
+        pass
+
+
+def _evict(index, keep: str = None):
+    """
+    Remove the files no entry refers to anymore, then least recently used entries until the files left on disk
+    fit in max_size. The entry of keep, the URL being used, is never removed, even if it does not fit on its own.
+    """
+    files = _blob_files()
+    digests = {entry['sha256'] for entry in index.values()}
+    now = time.time()
+    for digest, stat in list(files.items()):
+        if digest not in digests and now - stat.st_mtime > _ORPHAN_AGE:
+            _remove_blob(digest)
+            del files[digest]
+
+    total = sum(stat.st_size for stat in files.values())
+    for url in sorted(index, key=lambda u: index[u]['accessed']):
+        if total <= _settings['max_size']:
+            break
+        if url == keep:
+            continue
+        digest = index.pop(url)['sha256']
+        if all(entry['sha256'] != digest for entry in index.values()):
+            if digest in files:
+                total -= files.pop(digest).st_size
+            _remove_blob(digest)
+            _log.info(f'Evicted {url} from cache')
+
+
+def _download(response):
+    """Stream a response into the blob store, returning its hash and size."""
+    sha256 = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir(), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: response.read(_CHUNK_SIZE), b''):
+                sha256.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        digest = sha256.hexdigest()
+        try:
+            # Already stored, refreshed so that it is not taken for an orphan before it is indexed
+            os.utime(_blob_path(digest))
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            os.replace(tmp_path, _blob_path(digest))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest, size
+
+
+def fetch(url: str) -> str:
+    """
+    Returns the path of a local copy of the file at the given URL,
+    downloading it only if it is not cached or has changed upstream.
+
+    :param url: URL of the file
+    """
+    url = source_url(url)
+    with _lock:
+        entry = _read_index().get(url)
+    if entry is not None and not os.path.exists(_blob_path(entry['sha256'])):
+        entry = None
+
+    now = time.time()
+    if entry is not None and now - entry['checked'] < _settings['ttl']:
+        _log.info(f'Using cached copy of {url}')
+        return _touch(url, entry, checked=entry['checked'])
+
+    headers = {'User-Agent': _USER_AGENT}
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    try:
+        with urlopen(Request(url, headers=headers)) as response:
+            digest, size = _download(response)
+            entry = {
+                'sha256': digest,
+                'size': size,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+        _log.info(f'Downloaded {size} bytes from {url}')
+        instrumentation.add_bytes(size)
+    except HTTPError as e:
+        if e.code != 304 or entry is None:
+            raise
+        _log.info(f'Cached copy of {url} is up to date')
+    except URLError:
+        if entry is None:
+            raise
+        _log.warning(f'Could not revalidate {url}, using stale cached copy')
+
+    return _touch(url, entry, checked=now)
+
+
+def exists(url: str) -> bool:
+    """
+    Returns whether there is a file at the given URL, asking the server with a HEAD request instead of downloading it.
+    A file cached within the TTL exists without asking the server, and so does a cached file when the server
+    cannot be reached.
+
+    :param url: URL of the file
+    """
+    url = source_url(url)
+    entry = None
+    if _settings['enabled']:
+        with _lock:
+            entry = _read_index().get(url)
+        if entry is not None and not os.path.exists(_blob_path(entry['sha256'])):
+            entry = None
+    if entry is not None and time.time() - entry['checked'] < _settings['ttl']:
+        return True
+
+    try:
+        with urlopen(Request(url, headers={'User-Agent': _USER_AGENT}, method='HEAD')):
+            return True
+    except HTTPError:
+        return False
+    except URLError:
+        return entry is not None
+
+
+def _touch(url, entry, checked):
+    """Record a use of a cached file and return its path."""
+    entry = dict(entry, checked=checked, accessed=time.time())
+    with _lock:
+        index = _read_index()
+        previous = index.get(url)
+        index[url] = entry
+        # The previous version of a file changed upstream is not needed anymore
+        if previous is not None and previous['sha256'] != entry['sha256'] \
+                and all(e['sha256'] != previous['sha256'] for e in index.values()):
+            _remove_blob(previous['sha256'])
+        _evict(index, keep=url)
+        _write_index(index)
+    return _blob_path(entry['sha256'])
+
+
+def read_csv(url: str, **kwargs) -> pd.DataFrame:
+    """
+    Reads a CSV file through the cache. Accepts the same arguments as pd.read_csv.
+    """
+    return pd.read_csv(fetch(url) if _settings['enabled'] else source_url(url), **kwargs)
+
+
+def read_excel(url: str, **kwargs) -> pd.DataFrame:
+    """
+    Reads an Excel file through the cache. Accepts the same arguments as pd.read_excel.
+    """
+    return pd.read_excel(fetch(url) if _settings['enabled'] else source_url(url), **kwargs)
+
+
+def read_json(url: str):
+    """
+    Reads a JSON document through the cache.
+    """
+    if not _settings['enabled']:
+        with urlopen(Request(source_url(url), headers={'User-Agent': _USER_AGENT})) as response:
+            return json.load(response)
+    with open(fetch(url), 'r') as f:
+        return json.load(f)
+
+
+def clear():
+    """
+    Removes all cached files.
+    """
+    with _lock:
+        shutil.rmtree(os.path.join(cache_dir(), _BLOBS_DIRNAME), ignore_errors=True)
+        _write_index({})
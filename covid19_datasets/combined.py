@@ -1,17 +1,24 @@
 """Combined dataset for DELVE research"""
 
+import numpy as np
 import pandas as pd
 import pycountry
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from .our_world_in_data import OWIDCovid19
 from .oxford_government_policy import OxfordGovernmentPolicyDataset
 from .mask_policies import MaskPolicies
 from .world_bank import WorldBankDataBank
-from .mobility import Mobility
-from .apple import AppleMobility
+from .mobility import Mobility, COLUMN_NAMES as MOBILITY_COLUMN_NAMES
+from .apple import AppleMobility, COLUMN_NAMES as TRANSPORT_MOBILITY_COLUMN_NAMES
 from .excess_mortality import ExcessMortality
 from .utils import country_name_from_iso
+from .snapshot import read_snapshot, write_snapshot, snapshot_columns
+from .compact import compact_dtypes, memory_report
+from .query import IndexedDataset
+from . import shared
+from . import instrumentation
 
 from .weather import Weather
 from .constants import ISO_COLUMN_NAME, DATE_COLUMN_NAME
@@ -84,56 +91,195 @@ _WEATHER_COLUMNS = [
     'weather_wind_speed_mean'
 ]
 
+# The mobility source also keeps the identifiers of the regions in the report
+_MOBILITY_COLUMNS = (['metro_area', 'iso_3166_2_code', 'census_fips_code', 'place_id']
+                     + list(MOBILITY_COLUMN_NAMES.values()))
 
+_TRANSPORT_MOBILITY_COLUMNS = list(TRANSPORT_MOBILITY_COLUMN_NAMES.values())
+
+_EXCESS_MORTALITY_COLUMNS = [
+    'deaths_excess_daily_avg',
+    'deaths_excess_weekly'
+]
+
+
+@instrumentation.instrumented()
 def _policies_data() -> pd.DataFrame:
     oxford = OxfordGovernmentPolicyDataset()
     return oxford.get_data()[[ISO_COLUMN_NAME, DATE_COLUMN_NAME] + _POLICIES_COLUMNS]
 
 
+@instrumentation.instrumented()
 def _mask_data() -> pd.DataFrame:
     masks = MaskPolicies()
     return masks.get_data()[[ISO_COLUMN_NAME, DATE_COLUMN_NAME] + _MASKS_COLUMNS]
 
 
+@instrumentation.instrumented()
 def _cases_data() -> pd.DataFrame:
     owid_covid19 = OWIDCovid19()
     return owid_covid19.get_data()[[ISO_COLUMN_NAME, DATE_COLUMN_NAME] + _CASES_COLUMNS]
 
 
+@instrumentation.instrumented()
 def _reference_data() -> pd.DataFrame:
     wb = WorldBankDataBank()
     return wb.get_data()[[ISO_COLUMN_NAME] + _REFERENCE_COLUMNS]
 
 
+@instrumentation.instrumented()
 def _mobility_data() -> pd.DataFrame:
     mobility = Mobility()
     return mobility.get_data()
 
 
+@instrumentation.instrumented()
 def _transport_mobility_data() -> pd.DataFrame:
     apple_mobility = AppleMobility()
     return apple_mobility.get_country_data()
 
 
+@instrumentation.instrumented()
 def _excess_mortality_data() -> pd.DataFrame:
     excess_mortality = ExcessMortality()
     return excess_mortality.get_data()
 
 
+@instrumentation.instrumented()
 def _weather_data() -> pd.DataFrame:
     weather = Weather()
     return weather.get_data()[[ISO_COLUMN_NAME, DATE_COLUMN_NAME] + _WEATHER_COLUMNS]
 
 
-def _create_interventions_data() -> pd.DataFrame:
-    interventions_data = (_policies_data()
-                          .merge(_mask_data(), on=[ISO_COLUMN_NAME, DATE_COLUMN_NAME], how='left')
-                          .set_index([ISO_COLUMN_NAME, DATE_COLUMN_NAME]))
+_SOURCES = {
+    'policies': _policies_data,
+    'masks': _mask_data,
+    'cases': _cases_data,
+    'mobility': _mobility_data,
+    'transport_mobility': _transport_mobility_data,
+    'reference': _reference_data,
+    'excess_mortality': _excess_mortality_data,
+    'weather': _weather_data,
+}
+
+# Policies and masks determine the rows of the dataset, so they are always loaded
+_BASE_SOURCES = ['policies', 'masks']
+
+_SOURCE_COLUMNS = {
+    'policies': ['country_name'] + _POLICIES_COLUMNS,
+    'masks': _MASKS_COLUMNS,
+    'cases': _CASES_COLUMNS,
+    'mobility': _MOBILITY_COLUMNS,
+    'transport_mobility': _TRANSPORT_MOBILITY_COLUMNS,
+    'reference': _REFERENCE_COLUMNS,
+    'excess_mortality': _EXCESS_MORTALITY_COLUMNS,
+    'weather': _WEATHER_COLUMNS,
+}
+
+_STATIC_SOURCES = ['reference']  # Sources without dates, merged on ISO only
+
+
+def _source_names(columns: list = None) -> list:
+    """Names of the sources needed to provide the given columns, all sources if None."""
+    if columns is None:
+        return list(_SOURCES)
+
+    column_sources = {column: name for name, source_columns in _SOURCE_COLUMNS.items() for column in source_columns}
+    unknown = [c for c in columns if c not in column_sources and c not in (ISO_COLUMN_NAME, DATE_COLUMN_NAME)]
+    if unknown:
+        raise ValueError(f'Unknown columns: {unknown}')
+
+    needed = set(_BASE_SOURCES) | {column_sources[c] for c in columns if c in column_sources}
+    return [name for name in _SOURCES if name in needed]
+
+
+@instrumentation.instrumented()
+def _load_sources(names: list = None, workers: int = None) -> dict:
+    """
+    Load sources, returning a dictionary of dataframes keyed by source name.
+
+    :param names: Names of the sources to load, all sources if None
+    :param workers: If given, load sources concurrently using this many threads
+    """
+    names = list(_SOURCES) if names is None else names
+    if workers is None or workers <= 1:
+        return {name: _SOURCES[name]() for name in names}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {name: executor.submit(instrumentation.run_in_context(_SOURCES[name])) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def _key_index(codes: np.ndarray, dates: np.ndarray = None) -> pd.Index:
+    return pd.Index(codes) if dates is None else pd.MultiIndex.from_arrays([codes, dates])
+
+
+def _row_positions(data_keys: pd.Index, df: pd.DataFrame, keys: list, isos: pd.Index) -> np.ndarray:
+    """
+    Returns the position of the row of df matching each row of the left side of a join, -1 where there is none.
+
+    :param data_keys: Join keys of the left side, see _left_join
+    :param keys: Columns to join on, ISO and optionally DATE
+    :param isos: ISO codes of the left side, keys hold positions in it
+    """
+    codes = isos.get_indexer(df[ISO_COLUMN_NAME])
+    rows = np.flatnonzero(codes >= 0)  # Rows of other countries never match
+    dates = df[DATE_COLUMN_NAME].to_numpy()[rows] if DATE_COLUMN_NAME in keys else None
+    source_keys = _key_index(codes[rows], dates)
+
+    duplicated = source_keys.duplicated()
+    if duplicated.any():
+        # A merge would repeat the rows matching a duplicate, making the index of the dataset not unique
+        assert not data_keys.isin(source_keys[duplicated]).any(), 'Duplicates found in index!'
+        rows, source_keys = rows[~duplicated], source_keys[~duplicated]
+
+    return np.append(rows, -1)[source_keys.get_indexer(data_keys)]
+
+
+@instrumentation.instrumented()
+def _left_join(data: pd.DataFrame, others: list) -> pd.DataFrame:
+    """
+    Left join dataframes onto data, with the same result as merging them one after another with how='left'.
+    ISO codes are replaced by integer codes shared by all dataframes, every dataframe is aligned with the rows
+    of data once, and the columns are concatenated in a single copy.
+
+    :param data: Left side of the join, with ISO and DATE columns
+    :param others: Pairs of a dataframe and the columns to join it on, [ISO] or [ISO, DATE]
+    """
+    if not others:
+        return data
+
+    isos = pd.Index(data[ISO_COLUMN_NAME].unique())
+    codes = isos.get_indexer(data[ISO_COLUMN_NAME])
+    data_keys = {}
+    columns = set(data.columns)
+    aligned = []
+    for df, keys in others:
+        values = df[[c for c in df.columns if c not in keys]]
+        overlap = columns.intersection(values.columns)
+        if overlap:
+            raise ValueError(f'Columns {sorted(overlap)} are in more than one source')
+        columns.update(values.columns)
+
+        if tuple(keys) not in data_keys:
+            dates = data[DATE_COLUMN_NAME].to_numpy() if DATE_COLUMN_NAME in keys else None
+            data_keys[tuple(keys)] = _key_index(codes, dates)
+        positions = _row_positions(data_keys[tuple(keys)], df, keys, isos)
+
+        values = values.set_axis(pd.RangeIndex(len(values))).reindex(positions)
+        values.index = data.index
+        aligned.append(values)
+
+    return pd.concat([data] + aligned, axis=1)
+
+
+@instrumentation.instrumented()
+def _create_interventions_data(sources: dict) -> pd.DataFrame:
+    interventions_data = _left_join(sources['policies'], [(sources['masks'], [ISO_COLUMN_NAME, DATE_COLUMN_NAME])])
     interventions_data['npi_masks'] = (interventions_data['npi_masks']
-                                       .groupby(level=0)
+                                       .groupby(interventions_data[ISO_COLUMN_NAME])
                                        .ffill()
                                        .fillna(0.))
-    interventions_data = interventions_data.reset_index()
 
     country_name_map = {
         iso: country_name_from_iso(iso)
@@ -154,43 +300,202 @@ def _check_index(df):
     assert len(duplicates) == 0, 'Duplicates found in index!'
 
 
-def _create_data() -> pd.DataFrame:
-    interventions_data = _create_interventions_data()
-    interventions_cases = interventions_data.merge(
-        _cases_data(), on=[ISO_COLUMN_NAME, DATE_COLUMN_NAME], how='left')
+@instrumentation.instrumented()
+def _merge_sources(data: pd.DataFrame, sources: dict) -> pd.DataFrame:
+    """Left join the given non-base sources onto data, in the standard order."""
+    return _left_join(data, [
+        (sources[name], [ISO_COLUMN_NAME] if name in _STATIC_SOURCES else [ISO_COLUMN_NAME, DATE_COLUMN_NAME])
+        for name in _SOURCES if name in sources and name not in _BASE_SOURCES
+    ])
 
-    combined = (interventions_cases
-                .merge(_mobility_data(), on=[ISO_COLUMN_NAME, DATE_COLUMN_NAME], how='left')
-                .merge(_transport_mobility_data(), on=[ISO_COLUMN_NAME, DATE_COLUMN_NAME], how='left')
-                .merge(_reference_data(), on=ISO_COLUMN_NAME, how='left')
-                .merge(_excess_mortality_data(), on=[ISO_COLUMN_NAME, DATE_COLUMN_NAME], how='left')
-                .merge(_weather_data(), on=[ISO_COLUMN_NAME, DATE_COLUMN_NAME], how='left')
-                .set_index([ISO_COLUMN_NAME, DATE_COLUMN_NAME]))
+
+def _set_key_index(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Index a dataframe built by the join by ISO and DATE. This is done in place, as set_index would otherwise copy
+    all the other columns.
+    """
+    df.set_index([ISO_COLUMN_NAME, DATE_COLUMN_NAME], inplace=True)
+    return df
+
+
+@instrumentation.instrumented()
+def _combine(sources: dict) -> pd.DataFrame:
+    """Merge loaded sources into the combined dataset. Sources other than policies and masks are optional."""
+    combined = _set_key_index(_merge_sources(_create_interventions_data(sources), sources))
     
     _check_index(combined)
     
     return combined
 
 
+def _value_columns(df: pd.DataFrame) -> list:
+    return [c for c in df.columns if c not in (ISO_COLUMN_NAME, DATE_COLUMN_NAME)]
+
+
+@instrumentation.instrumented()
+def _add_sources(data: pd.DataFrame, sources: dict, merged_columns: dict) -> pd.DataFrame:
+    """
+    Merge more sources into an already combined dataset, keeping columns in the standard order.
+
+    :param data: The combined dataset
+    :param sources: The sources to add, keyed by source name
+    :param merged_columns: Columns of the sources already merged into data, keyed by source name
+    """
+    added = _set_key_index(_merge_sources(data.reset_index(), sources))
+    _check_index(added)
+
+    merged_columns = dict(merged_columns, **{name: _value_columns(df) for name, df in sources.items()})
+    source_columns = [c for name in _SOURCES if name in merged_columns for c in merged_columns[name]]
+    base_columns = [c for c in data.columns if c not in source_columns]
+    return added[base_columns + source_columns]
+
+
+def _create_data(workers: int = None) -> pd.DataFrame:
+    return _combine(_load_sources(workers=workers))
+
+
 class Combined:
     """
     Standardised dataset from multiple sources for DELVE research.
     """
 
     _data = None
-
-    def __init__(self, force_load: bool = False):
+    _compact = False
+    _snapshot = None
+    _shared = None
+    _merged_columns = {}  # Columns of each source other than policies and masks that have been merged
+    _query = None  # The data last indexed for queries and its IndexedDataset
+
+    def __init__(self, force_load: bool = False, workers: int = None, snapshot: str = None, compact: bool = False,
+                 columns: list = None, shared: str = None):
         """
         Loads the dataset and stores it in memory.
         Further instances of this class will reuse the same data
         :param force_load: If true, forces download of the dataset, even if it was loaded already
+        :param workers: If given, download and standardise the sources concurrently using this many threads.
+                        The result is the same as loading them one after another.
+        :param snapshot: If given, load the dataset from this Parquet snapshot instead of the sources
+        :param compact: If true, keep the dataset in memory with compact dtypes (see covid19_datasets.compact).
+                        This applies to the whole session, until the dataset is loaded again with force_load.
+        :param columns: If given, only load the sources needed for these columns.
+                        Other sources are loaded when their columns are requested later.
+        :param shared: If given, attach read-only to the dataset published at this path by another process
+                       with Combined.publish, instead of loading it (see covid19_datasets.shared)
         """
         # This is to make sure we only load the dataset once during a single session
         if Combined._data is None or force_load:
-            Combined._data = _create_data()
-
-    def get_data(self) -> pd.DataFrame:
+            Combined._data = None
+            Combined._compact = False
+            Combined._snapshot = snapshot
+            Combined._shared = shared
+            Combined._merged_columns = {}
+
+        self._columns = columns
+        self._workers = workers
+        self._load(columns)
+
+        if compact and not Combined._compact:
+            Combined._data = compact_dtypes(Combined._data)
+            Combined._compact = True
+
+    def _load(self, columns):
+        """Load whatever is missing to provide the given columns, all columns if None."""
+        if Combined._shared is not None:
+            loaded = self._attach()
+        elif Combined._snapshot is not None:
+            loaded = self._load_snapshot(columns)
+        else:
+            loaded = self._load_sources(columns)
+
+        if loaded and Combined._compact:
+            Combined._data = compact_dtypes(Combined._data)
+
+    def _attach(self):
+        if Combined._data is not None:
+            return False
+        Combined._data = shared.attach(Combined._shared)
+        return True
+
+    def _load_snapshot(self, columns):
+        if Combined._data is None:
+            Combined._data = read_snapshot(Combined._snapshot, columns=columns)
+            return True
+
+        all_columns = snapshot_columns(Combined._snapshot)
+        missing = [c for c in (columns or all_columns) if c not in Combined._data.columns]
+        if not missing:
+            return False
+
+        data = Combined._data.join(read_snapshot(Combined._snapshot, columns=missing))
+        Combined._data = data[[c for c in all_columns if c in data.columns]]
+        return True
+
+    def _load_sources(self, columns):
+        names = [name for name in _source_names(columns) if name not in Combined._merged_columns]
+        if Combined._data is not None:
+            names = [name for name in names if name not in _BASE_SOURCES]
+        if not names:
+            return False
+
+        sources = _load_sources(names, workers=self._workers)
+        if Combined._data is None:
+            Combined._data = _combine(sources)
+        else:
+            Combined._data = _add_sources(Combined._data, sources, Combined._merged_columns)
+        Combined._merged_columns.update({
+            name: _value_columns(df) for name, df in sources.items() if name not in _BASE_SOURCES
+        })
+        return True
+
+    def get_data(self, columns: list = None) -> pd.DataFrame:
         """
         Returns the dataset as Pandas dataframe
+
+        :param columns: If given, return only these columns, loading their sources if needed.
+                        Defaults to the columns this instance was created with.
+        """
+        columns = columns if columns is not None else self._columns
+        if columns is None:
+            self._load(None)
+            return Combined._data
+
+        self._load(columns)
+        return Combined._data[[c for c in Combined._data.columns if c in columns]]
+
+    def query(self, columns: list = None) -> IndexedDataset:
+        """
+        Returns the dataset indexed for fast selection of countries and date ranges, see covid19_datasets.query.
+        It is only built again when the dataset changes.
+
+        :param columns: If given, load the sources needed for these columns first.
+                        Defaults to the columns this instance was created with.
+        """
+        self._load(columns if columns is not None else self._columns)
+        if Combined._query is None or Combined._query[0] is not Combined._data:
+            Combined._query = (Combined._data, IndexedDataset(Combined._data))
+        return Combined._query[1]
+
+    def publish(self, path: str = None) -> str:
+        """
+        Publishes the dataset for other processes to attach to with Combined(shared=path), returning the path.
+        The caller is responsible for deleting it with covid19_datasets.shared.remove once the workers are done,
+        or can use covid19_datasets.shared.published instead.
+
+        :param path: Directory to write to, a new directory in shared memory by default
+        """
+        self._load(self._columns)
+        return shared.publish(Combined._data, path)
+
+    def memory_report(self) -> pd.DataFrame:
+        """
+        Returns the dtype and memory usage in bytes of every column of the dataset
+        """
+        return memory_report(Combined._data)
+
+    def to_snapshot(self, path: str):
+        """
+        Writes the dataset to a Parquet snapshot that can be loaded with Combined(snapshot=path)
+
+        :param path: Output path
         """
-        return Combined._data
+        write_snapshot(Combined._data, path)
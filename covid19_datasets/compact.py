@@ -0,0 +1,126 @@
+"""
+Compact dtype layout for the combined dataset, following the codebook in docs/codebook.md.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .constants import *
+from . import instrumentation
+
+
+# Ordinal scales, small integers with blanks for missing data
+_ORDINAL_COLUMNS = [
+    'npi_school_closing',
+    'npi_workplace_closing',
+    'npi_cancel_public_events',
+    'npi_gatherings_restrictions',
+    'npi_close_public_transport',
+    'npi_stay_at_home',
+    'npi_internal_movement_restrictions',
+    'npi_international_travel_controls',
+    'npi_income_support',
+    'npi_debt_relief',
+    'npi_public_information',
+    'npi_testing_policy',
+    'npi_contact_tracing',
+    'npi_masks'
+]
+
+# Integer counts, stored in the smallest nullable integer type that fits
+_COUNT_COLUMNS = [
+    'cases_total',
+    'cases_new',
+    'deaths_total',
+    'deaths_new',
+    'tests_total',
+    'tests_new',
+    'stats_population',
+    'stats_population_urban',
+    'stats_population_school_age',
+    'cases_days_since_first',
+    'deaths_days_since_first'
+]
+
+# Monetary values in USD, which need double precision
+_MONETARY_COLUMNS = [
+    'npi_fiscal_measures',
+    'npi_international_support',
+    'npi_healthcare_investment',
+    'npi_vaccine_investment'
+]
+
+_CATEGORICAL_COLUMNS = ['country_name']
+
+_INTEGER_DTYPES = ['Int8', 'Int16', 'Int32', 'Int64']
+
+
+def _is_integral(series: pd.Series) -> bool:
+    values = series.dropna().values
+    return bool(np.all(np.mod(values, 1) == 0))
+
+
+def _integer_dtype(series: pd.Series):
+    """Returns the smallest nullable integer dtype that holds the series, or None if it is not integral."""
+    if not _is_integral(series):
+        return None
+    low, high = series.min(), series.max()
+    for dtype in _INTEGER_DTYPES:
+        info = np.iinfo(dtype.lower())
+        if pd.isna(low) or (info.min <= low and high <= info.max):
+            return dtype
+    return None
+
+
+def _fits_float32(series: pd.Series) -> bool:
+    """Returns whether the series keeps all its values in single precision."""
+    values = series.to_numpy()
+    return bool(np.array_equal(values.astype(np.float32).astype(values.dtype), values, equal_nan=True))
+
+
+def _compact_dtype(series: pd.Series):
+    if series.name in _CATEGORICAL_COLUMNS:
+        return 'category'
+    if not pd.api.types.is_float_dtype(series) or series.name in _MONETARY_COLUMNS:
+        return None
+    if series.name in _ORDINAL_COLUMNS + _COUNT_COLUMNS:
+        # Sources sometimes have fractional counts, such as smoothed or imputed values,
+        # kept in double precision when they are too large for single precision
+        dtype = _integer_dtype(series)
+        if dtype is None and _fits_float32(series):
+            dtype = np.float32
+        return dtype
+    return np.float32
+
+
+@instrumentation.instrumented()
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns a copy of a dataset indexed by ISO and DATE using compact dtypes:
+    categorical ISO and country name, nullable integers for ordinal scales and counts that are whole numbers,
+    doubles for monetary values and fractional counts that single precision cannot hold exactly,
+    and single precision floats for everything else.
+
+    :param df: The dataset, as returned by Combined().get_data()
+    """
+    dtypes = {}
+    for column in df.columns:
+        dtype = _compact_dtype(df[column])
+        if dtype is not None:
+            dtypes[column] = dtype
+    df = df.astype(dtypes)
+
+    if isinstance(df.index, pd.MultiIndex) and ISO_COLUMN_NAME in df.index.names:
+        level = df.index.names.index(ISO_COLUMN_NAME)
+        df.index = df.index.set_levels(df.index.levels[level].astype('category'), level=level)
+    return df
+
+
+def memory_report(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the dtype and memory usage in bytes of every column of a dataframe, including its index.
+    """
+    usage = df.memory_usage(deep=True)
+    dtypes = df.dtypes.astype(str)
+    dtypes['Index'] = str(df.index.dtype) if not isinstance(df.index, pd.MultiIndex) else 'MultiIndex'
+    return pd.DataFrame({'dtype': dtypes, 'bytes': usage}).loc[usage.index]
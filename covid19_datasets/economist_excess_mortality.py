@@ -4,7 +4,8 @@ import datetime
 import logging
 
 from .constants import *
-from .utils import get_country_iso
+from . import cache, instrumentation
+from .utils import country_isos, weekly_to_daily
 
 _log = logging.getLogger(__name__)
 
@@ -41,6 +42,7 @@ COLUMN_NAMES = {
 }
 
 
+@instrumentation.instrumented()
 def _load_dataset():
     _log.info("Loading The Economist excess mortality dataset")
     all_data = []
@@ -48,7 +50,7 @@ def _load_dataset():
         path = COUNTRY_PATH_FORMAT.format(country)
         try:
             _log.info(f"Loading {country} from " + path)
-            country_df = pd.read_csv(path)
+            country_df = cache.read_csv(path)
         except:
             _log.error(f'ERROR WITH {country}')
 
@@ -62,7 +64,7 @@ def _load_dataset():
 
     df = df.drop(['year', 'week', 'month'], axis='columns')
 
-    df[ISO_COLUMN_NAME] = df['country'].apply(get_country_iso)
+    df[ISO_COLUMN_NAME] = country_isos(df['country'])
 
     return df
 
@@ -108,24 +110,10 @@ class EconomistExcessMortality():
         if daily:
             df[DATE_COLUMN_NAME] = df['start_date']
 
-            def _resample_start_to_end(country_df):
-                # add last week's end
-                last_row = pd.DataFrame(
-                    country_df[-1:].values, columns=country_df.columns)
-                last_row[DATE_COLUMN_NAME] = country_df['end_date'].max()
-                country_df = country_df.append(last_row)
+            # every day up to the end of the last week gets the values of the week it is in
+            df = weekly_to_daily(df, ['country'], last_date='end_date', method='ffill', skipna=False)
 
-                country_df = country_df.set_index(
-                    DATE_COLUMN_NAME).resample('D').ffill()
-
-                return country_df
-
-            df = df.set_index('country').groupby('country') \
-                   .apply(_resample_start_to_end) \
-                   .reset_index()
-
-            df['deaths_excess_weekly'] = df.apply(
-                lambda row: row['excess_deaths'] if row['end_date'] == row[DATE_COLUMN_NAME] else np.NaN, axis=1)
+            df['deaths_excess_weekly'] = df['excess_deaths'].where(df['end_date'] == df[DATE_COLUMN_NAME])
 
             df = df.drop(['start_date', 'end_date'], axis='columns')
 
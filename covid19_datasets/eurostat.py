@@ -7,17 +7,20 @@ import datetime
 import logging
 
 from .constants import *
-from .utils import get_country_iso, last_day_of_calenderweek
+from . import cache, instrumentation
+from .utils import country_isos, week_end_dates, weekly_to_daily
 
 _log = logging.getLogger(__name__)
 
 _PATH = 'https://raw.githubusercontent.com/rs-delve/covid19_datasets/master/data/demo_r_mweek3_1_Data.csv'
 _KEY_COLUMNS = ['GEO', 'AGE', 'SEX', 'WEEK']
+_YEAR = 2020  # Excess mortality is computed for this year, against the mean of the years before
 
 
+@instrumentation.instrumented()
 def _load_dataset():
     _log.info("Loading EuroStat data")
-    df = pd.read_csv(_PATH)
+    df = cache.read_csv(_PATH)
     df = df.replace(':', np.nan)
     df['YEAR'] = df.TIME.str.slice(stop=4).astype(int)
     df['WEEK'] = df.TIME.str.slice(start=5, stop=8).astype(int)
@@ -25,31 +28,20 @@ def _load_dataset():
     df.loc[:, 'Value'] = df.Value.str.replace(',', '').astype(float)
 
     _log.info('Computing Excess Mortality')
-    baseline = df.query('YEAR < 2020').groupby(_KEY_COLUMNS)[
+    baseline = df.query('YEAR < @_YEAR').groupby(_KEY_COLUMNS)[
         'Value'].mean().rename('deaths_expected')
-    current = df.query('YEAR == 2020').set_index(_KEY_COLUMNS)['Value']
+    current = df.query('YEAR == @_YEAR').set_index(_KEY_COLUMNS)['Value']
 
     excess = pd.concat(
         [baseline, (current - baseline).rename('deaths_excess_weekly')], axis=1)
     excess = excess.reset_index().rename(columns={'GEO': 'country'})
 
-    excess[DATE_COLUMN_NAME] = excess['WEEK'].apply(
-        lambda w: last_day_of_calenderweek(2020, w))
-    excess[ISO_COLUMN_NAME] = excess.country.apply(get_country_iso)
+    excess[DATE_COLUMN_NAME] = week_end_dates(_YEAR, excess['WEEK'])
+    excess[ISO_COLUMN_NAME] = country_isos(excess.country)
 
     return excess
 
 
-def _resample(grouped_df):
-    # Dates are the end of the week, so we move the min date back to the beginning of that week
-    min_date = grouped_df.DATE.min() - pd.offsets.Day(6)
-    max_date = grouped_df.DATE.max()
-    grouped = grouped_df.set_index('DATE').reindex(
-        pd.date_range(min_date, max_date, freq='D'))
-    grouped.loc[:, 'deaths_excess_daily_avg'] = grouped.loc[:, 'deaths_excess_daily_avg'].bfill(limit=7)
-    return grouped
-
-
 class EuroStatExcessMortality():
     """
     Excess mortality computed from EuroStat mortality statstics.
@@ -77,12 +69,7 @@ class EuroStatExcessMortality():
             df = EuroStatExcessMortality.data
             df['deaths_excess_daily_avg'] = df['deaths_excess_weekly'] / 7
             key_columns = ['country', 'AGE', 'SEX', 'ISO']
-            daily = (df
-                     .groupby(key_columns)
-                     .apply(_resample)
-                     .drop(['country', 'AGE', 'SEX', 'ISO'], axis='columns')
-                     .reset_index()
-                     .rename(columns={'level_4': DATE_COLUMN_NAME}))
-            return daily
+            # Dates are the end of the week, so each series starts at the beginning of its first week
+            return weekly_to_daily(df, key_columns, days_before=6, fill_columns=['deaths_excess_daily_avg'], limit=7)
         else:
             return EuroStatExcessMortality.data
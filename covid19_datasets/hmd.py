@@ -6,7 +6,8 @@ https://www.mortality.org/
 import pandas as pd
 import logging
 from .constants import *
-from .utils import last_day_of_calenderweek
+from . import cache, instrumentation
+from .utils import week_end_dates, weekly_to_daily
 
 _log = logging.getLogger(__name__)
 
@@ -19,11 +20,15 @@ COLUMN_NAMES = {
     'D85p': 'deaths_excess_weekly_age_85_plus',
     'DTotal': 'deaths_excess_weekly'
 }
+_KEY_COLUMNS = [ISO_COLUMN_NAME, 'Sex', 'Week']
+_BASELINE_YEARS = (2015, 2019)
+_YEARS = (2020,)
 
 
+@instrumentation.instrumented()
 def _load_dataset():
     _log.info(f'Loading data from {_PATH}')
-    df = pd.read_csv(_PATH, skiprows=2)
+    df = cache.read_csv(_PATH, skiprows=2)
     df = df.drop([
         'R0_14',	
         'R15_64',	
@@ -39,22 +44,50 @@ def _load_dataset():
     return df
 
 
-def _resample(grouped_df):
-    # Dates are the end of the week, so we move the min date back to the beginning of that week
-    min_date = grouped_df.DATE.min() - pd.offsets.Day(6)
-    max_date = grouped_df.DATE.max()
-    grouped = grouped_df.set_index('DATE').reindex(
-        pd.date_range(min_date, max_date, freq='D'))
-    grouped.loc[:, 'deaths_excess_daily_avg'] = grouped.loc[:, 'deaths_excess_daily_avg'].bfill(limit=7)
-    return grouped
+@instrumentation.instrumented()
+def _compute_baseline(df, baseline_years):
+    """Mean weekly deaths over the baseline years, both included."""
+    first, last = baseline_years
+    return (df[df['Year'].between(first, last)]
+            .groupby(_KEY_COLUMNS)
+            .mean()
+            .drop(['Year'], axis='columns'))
+
+
+@instrumentation.instrumented()
+def _compute_excess(df, baseline, years):
+    """Weekly excess deaths of every given year against the same baseline."""
+    current = df[df['Year'].isin(years)]
+    expected = baseline.reindex(pd.MultiIndex.from_frame(current[_KEY_COLUMNS]))
+    columns = list(baseline.columns)
+
+    excess = current[_KEY_COLUMNS].reset_index(drop=True)
+    for column in columns:
+        excess[column] = current[column].to_numpy() - expected[column].to_numpy()
+    excess[DATE_COLUMN_NAME] = week_end_dates(current['Year'], current['Week'])
+    excess = (excess
+              .dropna(how='all', subset=columns)
+              .sort_values([ISO_COLUMN_NAME, 'Sex', DATE_COLUMN_NAME], kind='mergesort')
+              .reset_index(drop=True))
+    excess['Sex'] = excess['Sex'].replace({'b': 'Total', 'm': 'Male', 'f': 'Female'})
+
+    excess = excess.rename(columns=COLUMN_NAMES)
+    excess['deaths_excess_daily_avg'] = excess['deaths_excess_weekly'] / 7.0
+
+    excess[ISO_COLUMN_NAME] = excess[ISO_COLUMN_NAME].replace({'DEUTNP': 'DEU'})  # HMD has a special code for "Germany Total Population"
+    return excess
 
 
 class HMDExcessMortality:
     """
     Excess mortality using data from the Human Mortality Database.
+    Baselines and excess mortality are computed once per set of parameters and kept until the data is reloaded.
+    Every call returns a copy, which callers are free to modify.
     """
 
     data = None
+    _baselines = {}
+    _excess = {}
 
     def __init__(self, force_load=False):
         """
@@ -66,6 +99,8 @@ class HMDExcessMortality:
         # This is to make sure we only load the dataset once during a single session
         if HMDExcessMortality.data is None or force_load:
             HMDExcessMortality.data = _load_dataset()
+            HMDExcessMortality._baselines = {}
+            HMDExcessMortality._excess = {}
 
     def get_raw_data(self) -> pd.DataFrame:
         """
@@ -73,35 +108,38 @@ class HMDExcessMortality:
         """
         return HMDExcessMortality.data
 
-    def get_data(self, daily=False) -> pd.DataFrame:
+    def get_baseline(self, baseline_years=_BASELINE_YEARS) -> pd.DataFrame:
+        """
+        Returns the mean weekly deaths over the baseline years, indexed by ISO, Sex and Week.
+
+        :param baseline_years: First and last year of the baseline, both included
+        """
+        baseline_years = tuple(baseline_years)
+        if baseline_years not in HMDExcessMortality._baselines:
+            HMDExcessMortality._baselines[baseline_years] = _compute_baseline(self.get_raw_data(), baseline_years)
+        return HMDExcessMortality._baselines[baseline_years].copy()
+
+    def get_data(self, daily=False, baseline_years=_BASELINE_YEARS, years=_YEARS) -> pd.DataFrame:
         """
         Returns the compute excess mortality dataset as Pandas dataframe.
+
+        :param daily: If true, returns a row per day instead of per week
+        :param baseline_years: First and last year of the baseline, both included
+        :param years: Year or years to compute excess mortality for, all against the same baseline
         """
-        df = self.get_raw_data()
-        key_cols = [ISO_COLUMN_NAME, 'Sex', 'Week']
-        baseline = (df.query('Year < 2020 and Year >= 2015')
-                    .groupby(key_cols)
-                    .mean()
-                    .drop(['Year'], axis='columns'))
-        current = (df.query('Year == 2020')
-                   .drop(['Year'], axis='columns')
-                   .set_index(key_cols))
-
-        excess = (current - baseline).dropna(how='all').reset_index()
-        excess[DATE_COLUMN_NAME] = excess['Week'].apply(lambda w: last_day_of_calenderweek(2020, w))
-        excess['Sex'] = excess['Sex'].replace({'b': 'Total', 'm': 'Male', 'f': 'Female'})   
-
-        excess = excess.rename(columns=COLUMN_NAMES)
-        excess['deaths_excess_daily_avg'] = excess['deaths_excess_weekly'] / 7.0
-
-        excess[ISO_COLUMN_NAME] = excess[ISO_COLUMN_NAME].replace({'DEUTNP': 'DEU'})  # HMD has a special code for "Germany Total Population"
-        
+        baseline_years = tuple(baseline_years)
+        years = (years,) if isinstance(years, int) else tuple(sorted(years))
+        key = (baseline_years, years, daily)
+        if key in HMDExcessMortality._excess:
+            return HMDExcessMortality._excess[key].copy()
+
         if daily:
-            excess = (excess
-                      .groupby(['ISO', 'Sex'])
-                      .apply(_resample)
-                      .drop(['ISO', 'Sex', 'Week'], axis='columns')
-                      .reset_index()
-                      .rename(columns={'level_2': 'DATE'}))
-
-        return excess
+            excess = self.get_data(baseline_years=baseline_years, years=years)
+            # Dates are the end of the week, so each series starts at the beginning of its first week
+            excess = weekly_to_daily(excess.drop(['Week'], axis='columns'), [ISO_COLUMN_NAME, 'Sex'], days_before=6,
+                                     fill_columns=['deaths_excess_daily_avg'], limit=7)
+        else:
+            excess = _compute_excess(self.get_raw_data(), self.get_baseline(baseline_years), years)
+
+        HMDExcessMortality._excess[key] = excess
+        return excess.copy()
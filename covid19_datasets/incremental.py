@@ -0,0 +1,175 @@
+"""
+Incremental rebuild of the combined dataset.
+
+Alongside each snapshot we store a fingerprint file with a hash of every
+(ISO, DATE) row of every source. On the next build the sources are loaded
+again and hashed, and for each country the rows from the first changed date
+onwards are recomputed and merged into the previous snapshot. Countries whose
+sources did not change are carried over as they are.
+"""
+
+import os
+import pandas as pd
+
+from . import combined
+from . import instrumentation
+from .constants import *
+from .snapshot import read_snapshot, write_snapshot
+
+import logging
+_log = logging.getLogger(__name__)
+
+
+_KEY_COLUMNS = ['source', ISO_COLUMN_NAME, DATE_COLUMN_NAME]
+_MAX_CHANGED_FRACTION = 0.5
+
+
+def fingerprints_path(snapshot_path: str) -> str:
+    """
+    Returns the path of the fingerprint file stored alongside a snapshot.
+    """
+    return os.path.splitext(snapshot_path)[0] + '_fingerprints.parquet'
+
+
+@instrumentation.instrumented()
+def _fingerprints(sources: dict) -> pd.DataFrame:
+    """Hash every row of every source, keyed by source, ISO and DATE."""
+    all_fingerprints = []
+    for name, df in sources.items():
+        keys = [c for c in (ISO_COLUMN_NAME, DATE_COLUMN_NAME) if c in df.columns]
+        fingerprints = df[keys].reset_index(drop=True)
+        if DATE_COLUMN_NAME not in keys:  # Reference data is static, so has no dates
+            fingerprints[DATE_COLUMN_NAME] = pd.NaT
+        fingerprints['hash'] = pd.util.hash_pandas_object(df.drop(keys, axis='columns'), index=False).values
+        fingerprints.insert(0, 'source', name)
+        all_fingerprints.append(fingerprints)
+    return pd.concat(all_fingerprints, axis=0, ignore_index=True)
+
+
+def _changed_ranges(previous: pd.DataFrame, current: pd.DataFrame) -> pd.Series:
+    """
+    Compare two sets of fingerprints, returning the first changed date of each changed country.
+    Countries whose static data changed get the earliest possible date.
+    """
+    previous = previous.set_index(_KEY_COLUMNS)['hash']
+    current = current.set_index(_KEY_COLUMNS)['hash']
+
+    common = previous.index.intersection(current.index)
+    modified = common[previous.loc[common].values != current.loc[common].values]
+    changed = (modified
+               .append(current.index.difference(previous.index))
+               .append(previous.index.difference(current.index))
+               .to_frame(index=False))
+
+    changed[DATE_COLUMN_NAME] = changed[DATE_COLUMN_NAME].fillna(pd.Timestamp.min)
+    return changed.groupby(ISO_COLUMN_NAME)[DATE_COLUMN_NAME].min()
+
+
+@instrumentation.instrumented()
+def _merge_changes(previous: pd.DataFrame, sources: dict, starts: pd.Series) -> pd.DataFrame:
+    """
+    Recompute rows of changed countries from their first changed date and merge them into the previous data.
+    Returns None if the recomputed rows do not have the same columns as the previous data.
+    """
+    changed_isos = starts.index
+    recomputed = combined._combine({
+        name: df[df[ISO_COLUMN_NAME].isin(changed_isos)]
+        for name, df in sources.items()
+    })
+    if list(recomputed.columns) != list(previous.columns):
+        _log.info('Columns changed since the previous snapshot')
+        return None
+
+    def _in_changed_range(df):
+        isos = df.index.get_level_values(ISO_COLUMN_NAME)
+        dates = df.index.get_level_values(DATE_COLUMN_NAME)
+        return isos.isin(changed_isos) & (dates >= isos.map(starts))
+
+    data = pd.concat([
+        previous[~_in_changed_range(previous)],
+        recomputed[_in_changed_range(recomputed)]
+    ], axis=0).sort_index()
+
+    combined._check_index(data)
+    return data
+
+
+def _canonical(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sort a dataset by ISO and DATE and give it the dtypes it has after a round trip through a snapshot,
+    so that full, incremental and unchanged builds all return the same frame.
+    """
+    df = df.sort_index(kind='mergesort')
+    return df.astype({
+        c: float if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c]) else object
+        for c in df.columns
+    })
+
+
+@instrumentation.instrumented()
+def _verify(data: pd.DataFrame, sources: dict):
+    _log.info('Verifying incremental build against a full rebuild')
+    pd.testing.assert_frame_equal(data, _canonical(combined._combine(sources)))
+    _log.info('Incremental build matches full rebuild')
+
+
+def _can_update(snapshot_path, previous_fingerprints, fingerprints):
+    if not os.path.exists(snapshot_path) or previous_fingerprints is None:
+        _log.info('No previous snapshot with fingerprints found')
+        return False
+    if set(previous_fingerprints.source.unique()) != set(fingerprints.source.unique()):
+        _log.info('Sources changed since the previous snapshot')
+        return False
+    if fingerprints.duplicated(_KEY_COLUMNS).any() or previous_fingerprints.duplicated(_KEY_COLUMNS).any():
+        _log.info('Sources contain duplicate rows')
+        return False
+    return True
+
+
+@instrumentation.instrumented()
+def update_snapshot(snapshot_path: str, workers: int = None, full: bool = False, verify: bool = False,
+                    max_changed_fraction: float = _MAX_CHANGED_FRACTION) -> pd.DataFrame:
+    """
+    Update a combined dataset snapshot, recomputing only the parts whose sources changed.
+    Falls back to a full rebuild if there is no usable previous snapshot, or if most countries changed.
+    Writes the updated snapshot and its fingerprints, and returns the dataset sorted by ISO and DATE,
+    with the dtypes it has when read back from the snapshot.
+
+    :param snapshot_path: Path of the snapshot to update
+    :param workers: If given, load sources concurrently using this many threads
+    :param full: If true, always do a full rebuild
+    :param verify: If true, check that the result equals a full rebuild
+    :param max_changed_fraction: Do a full rebuild if more than this fraction of countries changed
+    """
+    sources = combined._load_sources(workers=workers)
+    fingerprints = _fingerprints(sources)
+
+    previous_fingerprints = None
+    if os.path.exists(fingerprints_path(snapshot_path)):
+        previous_fingerprints = pd.read_parquet(fingerprints_path(snapshot_path))
+
+    data = None
+    if not full and _can_update(snapshot_path, previous_fingerprints, fingerprints):
+        previous = read_snapshot(snapshot_path)
+        starts = _changed_ranges(previous_fingerprints, fingerprints)
+        changed_fraction = len(starts) / max(previous.index.get_level_values(ISO_COLUMN_NAME).nunique(), 1)
+        _log.info(f'{len(starts)} countries changed since the previous snapshot')
+
+        if changed_fraction > max_changed_fraction:
+            _log.info('Too many countries changed for an incremental update')
+        elif len(starts) == 0:
+            data = previous
+        else:
+            data = _merge_changes(previous, sources, starts)
+
+    if data is None:
+        _log.info('Doing a full rebuild')
+        data = _canonical(combined._combine(sources))
+    else:
+        data = _canonical(data)
+        if verify:
+            _verify(data, sources)
+
+    write_snapshot(data, snapshot_path)
+    fingerprints.to_parquet(fingerprints_path(snapshot_path), index=False)
+    return data
@@ -0,0 +1,295 @@
+"""
+Timing and memory instrumentation of dataset builds.
+
+Loaders, transformations and merges are wrapped in named stages. While instrumentation is enabled, every stage
+records its wall time, peak memory, bytes downloaded and rows in and out, and the run can be written out as a
+JSON report. Stages nest: a stage run inside another one (also in worker threads started with a copied context)
+records it as its parent, and bytes downloaded count towards all enclosing stages.
+
+Instrumentation is off by default and costs a function call per stage when off. Enable it with `enable` or by
+setting the COVID19_DATASETS_INSTRUMENT environment variable.
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import functools
+import io
+import itertools
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+_log = logging.getLogger(__name__)
+
+_settings = {
+    'enabled': bool(os.environ.get('COVID19_DATASETS_INSTRUMENT')),
+    'memory': False,
+    'profile': frozenset(),
+    'profile_dir': None,
+}
+
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_stages = []
+_started = time.time()
+_current = contextvars.ContextVar('covid19_datasets_stage', default=None)
+_profiling = threading.local()
+
+_PROFILE_ENTRIES = 20
+
+
+def enable(memory: bool = False, profile=None, profile_dir: str = None):
+    """
+    Start recording stages.
+
+    :param memory: If true, trace memory allocations to measure the peak memory of each stage.
+                   This slows the build down considerably. Peaks are for the whole process, so they include
+                   the work of other threads running at the same time.
+    :param profile: Names of stages to run under cProfile, or '*' for all stages. The functions taking the most
+                    cumulative time are added to the stage record.
+    :param profile_dir: If given, also dump the full profile of each profiled stage to this directory
+    """
+    _settings['enabled'] = True
+    _settings['memory'] = memory
+    _settings['profile'] = frozenset([profile] if isinstance(profile, str) else profile or [])
+    _settings['profile_dir'] = profile_dir
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """Stop recording stages. Stages recorded so far are kept until `reset`."""
+    _settings['enabled'] = False
+    if _settings['memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _settings['memory'] = False
+
+
+def enabled() -> bool:
+    return _settings['enabled']
+
+
+def reset():
+    """Discard the recorded stages."""
+    global _started
+    with _lock:
+        _stages.clear()
+        _started = time.time()
+
+
+def _rows(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, dict):
+        rows = [_rows(v) for v in value.values()]
+        rows = [r for r in rows if r is not None]
+        return sum(rows) if rows else None
+    return None
+
+
+class Stage:
+    """
+    Measurements of a single stage.
+    rows_in and rows_out can be set inside the stage when they are not the arguments and result of a function.
+    """
+
+    def __init__(self, name: str, parent):
+        self.id = next(_ids)
+        self.name = name
+        self.parent = parent
+        self.thread = threading.current_thread().name
+        self.start = time.time() - _started
+        self.seconds = None
+        self.peak_bytes = None
+        self.bytes_downloaded = 0
+        self.rows_in = None
+        self.rows_out = None
+        self.error = None
+        self.profile = None
+        self._memory_start = None
+        self._memory_peak = 0
+
+    def as_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'parent': self.parent.id if self.parent is not None else None,
+            'thread': self.thread,
+            'start': self.start,
+            'seconds': self.seconds,
+            'peak_bytes': self.peak_bytes,
+            'bytes_downloaded': self.bytes_downloaded,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'error': self.error,
+            'profile': self.profile,
+        }
+
+
+def _start_memory(record):
+    if not tracemalloc.is_tracing():
+        return
+    current, peak = tracemalloc.get_traced_memory()
+    if record.parent is not None:
+        record.parent._memory_peak = max(record.parent._memory_peak, peak)
+    tracemalloc.reset_peak()
+    record._memory_start = current
+    record._memory_peak = current
+
+
+def _stop_memory(record):
+    if record._memory_start is None or not tracemalloc.is_tracing():
+        return
+    record._memory_peak = max(record._memory_peak, tracemalloc.get_traced_memory()[1])
+    record.peak_bytes = record._memory_peak - record._memory_start
+    if record.parent is not None:
+        record.parent._memory_peak = max(record.parent._memory_peak, record._memory_peak)
+
+
+def _start_profile(record):
+    profile = _settings['profile']
+    if not ('*' in profile or record.name in profile) or getattr(_profiling, 'active', False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # Another profiler is running in a different thread
+        return None
+    _profiling.active = True
+    return profiler
+
+
+def _stop_profile(record, profiler):
+    profiler.disable()
+    _profiling.active = False
+    stats = pstats.Stats(profiler, stream=io.StringIO()).sort_stats('cumulative')
+    record.profile = [
+        {
+            'function': f'{filename}:{line}({function})',
+            'calls': calls,
+            'total_seconds': total,
+            'cumulative_seconds': cumulative,
+        }
+        for (filename, line, function), (_, calls, total, cumulative, _) in
+        sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:_PROFILE_ENTRIES]
+    ]
+    if _settings['profile_dir'] is not None:
+        os.makedirs(_settings['profile_dir'], exist_ok=True)
+        stats.dump_stats(os.path.join(_settings['profile_dir'], f'{record.id}_{record.name}.prof'))
+
+
+@contextlib.contextmanager
+def stage(name: str, rows_in: int = None):
+    """
+    Context manager recording a stage. Yields the Stage, or None when instrumentation is disabled.
+
+    :param name: Name of the stage in the report
+    :param rows_in: Number of input rows, if known
+    """
+    if not _settings['enabled']:
+        yield None
+        return
+
+    record = Stage(name, _current.get())
+    record.rows_in = rows_in
+    token = _current.set(record)
+    _start_memory(record)
+    profiler = _start_profile(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record.error = type(e).__name__
+        raise
+    finally:
+        record.seconds = time.perf_counter() - started
+        if profiler is not None:
+            _stop_profile(record, profiler)
+        _stop_memory(record)
+        _current.reset(token)
+        with _lock:
+            _stages.append(record)
+        _log.debug(f'{name} took {record.seconds:.3f}s')
+
+
+def record(name: str, func, *args, **kwargs):
+    """
+    Call a function as a stage, counting rows in from the dataframe arguments and rows out from the result.
+
+    :param name: Name of the stage
+    """
+    if not _settings['enabled']:
+        return func(*args, **kwargs)
+    with stage(name, rows_in=_rows(dict(enumerate(args), **kwargs))) as current:
+        result = func(*args, **kwargs)
+        if current is not None:
+            current.rows_out = _rows(result)
+        return result
+
+
+def instrumented(name: str = None):
+    """
+    Decorator recording each call of a function as a stage, see `record`.
+
+    :param name: Name of the stage, the qualified name of the function by default
+    """
+    def decorator(func):
+        stage_name = name or f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return record(stage_name, func, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def add_bytes(count: int):
+    """Count downloaded bytes towards the current stage and all stages enclosing it."""
+    record = _current.get()
+    if record is None:
+        return
+    with _lock:
+        while record is not None:
+            record.bytes_downloaded += count
+            record = record.parent
+
+
+def run_in_context(func):
+    """
+    Wrap a function so that it runs in a copy of the current context.
+    Use it for functions submitted to a thread pool, so that their stages are nested in the current stage.
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)
+
+
+def report() -> dict:
+    """
+    Returns the run report: the recorded stages in order of their start, and the totals of the top level stages.
+    """
+    with _lock:
+        stages = sorted((s.as_dict() for s in _stages), key=lambda s: s['start'])
+    top_level = [s for s in stages if s['parent'] is None]
+    return {
+        'started': _started,
+        'memory_traced': _settings['memory'],
+        'seconds': sum(s['seconds'] for s in top_level),
+        'bytes_downloaded': sum(s['bytes_downloaded'] for s in top_level),
+        'stages': stages,
+    }
+
+
+def write_report(path: str):
+    """Write the run report as JSON."""
+    with open(path, 'w') as f:
+        json.dump(report(), f, indent=2)
+    _log.info(f'Wrote instrumentation report to {path}')
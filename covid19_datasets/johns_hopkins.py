@@ -1,7 +1,8 @@
-from typing import Callable
 import pandas as pd
 import logging
 from .constants import *
+from . import cache, instrumentation
+from .timeseries import RegionTimeSeries
 _log = logging.getLogger(__name__)
 
 
@@ -22,16 +23,27 @@ _DROP_US_COLUMNS = ['iso2', 'iso3', 'code3', 'FIPS', 'Admin2', 'Combined_Key', '
 _KEY_COLUMNS = ['Country_Region', 'Province_State']
 
 
-def _standardise(ts_df: pd.DataFrame, label: str) -> pd.DataFrame:
-  """Convert wide format dataframe into long format."""
-  long_df = (ts_df
-             .rename(columns=_RENAME_COLS)
-             .melt(id_vars=_KEY_COLUMNS, var_name=DATE_COLUMN_NAME, value_name=f'total_{label}'))
+def _to_matrix(ts_df: pd.DataFrame):
+  """Split a wide format dataframe into its region keys, dates and a region x date matrix."""
+  ts_df = ts_df.rename(columns=_RENAME_COLS)
+  date_columns = [c for c in ts_df.columns if c not in _KEY_COLUMNS]
+  dates = pd.to_datetime(date_columns, format='%m/%d/%y')
+  return ts_df[_KEY_COLUMNS].reset_index(drop=True), dates, ts_df[date_columns].to_numpy()
 
-  long_df.DATE = pd.to_datetime(long_df.DATE, format='%m/%d/%y')
-  long_df = long_df.rename(columns={'iso3': ISO_COLUMN_NAME})
 
-  return long_df 
+def _standardise(cases_df: pd.DataFrame, deaths_df: pd.DataFrame) -> RegionTimeSeries:
+  """Combine wide format cases and deaths into series of the regions and dates they have in common."""
+  cases_keys, cases_dates, cases = _to_matrix(cases_df)
+  deaths_keys, deaths_dates, deaths = _to_matrix(deaths_df)
+
+  rows = (cases_keys.reset_index().rename(columns={'index': 'cases_row'})
+          .merge(deaths_keys.reset_index().rename(columns={'index': 'deaths_row'}), on=_KEY_COLUMNS))
+  dates = cases_dates[cases_dates.isin(deaths_dates)]
+  cases = cases[rows.cases_row.to_numpy()][:, cases_dates.get_indexer(dates)]
+  deaths = deaths[rows.deaths_row.to_numpy()][:, deaths_dates.get_indexer(dates)]
+
+  return RegionTimeSeries(rows[_KEY_COLUMNS], dates, {'total_cases': cases, 'total_deaths': deaths},
+                          id_columns=_KEY_COLUMNS)
 
 
 def _convert_us_data(us_df: pd.DataFrame) -> pd.DataFrame:
@@ -41,29 +53,28 @@ def _convert_us_data(us_df: pd.DataFrame) -> pd.DataFrame:
          .groupby(_KEY_COLUMNS, as_index=False).sum())
 
 
-def _load_dataset() -> pd.DataFrame:
-    jh_global_cases = pd.read_csv(_JH_GLOBAL_CASES_PATH)
-    jh_us_cases = pd.read_csv(_JH_US_CASES_PATH)
-    jh_global_deaths = pd.read_csv(_JH_GLOBAL_DEATHS_PATH)
-    jh_us_deaths = pd.read_csv(_JH_US_DEATHS_PATH)
-    jh_lookup = pd.read_csv(_JH_LOOKUP_PATH)
+@instrumentation.instrumented()
+def _load_dataset() -> RegionTimeSeries:
+    jh_global_cases = cache.read_csv(_JH_GLOBAL_CASES_PATH)
+    jh_us_cases = cache.read_csv(_JH_US_CASES_PATH)
+    jh_global_deaths = cache.read_csv(_JH_GLOBAL_DEATHS_PATH)
+    jh_us_deaths = cache.read_csv(_JH_US_DEATHS_PATH)
+    jh_lookup = cache.read_csv(_JH_LOOKUP_PATH)
 
     jh_lookup = jh_lookup[jh_lookup.Admin2.isna()]
 
-    jh_cases = _standardise(
-        jh_global_cases.drop(_DROP_GLOBAL_COLUMNS, axis='columns'), 'cases')
-    jh_deaths = _standardise(
-        jh_global_deaths.drop(_DROP_GLOBAL_COLUMNS, axis='columns'), 'deaths')
-
-    us_cases = _standardise(_convert_us_data(jh_us_cases), 'cases')
-    us_deaths = _standardise(_convert_us_data(jh_us_deaths), 'deaths')
-    us_data = us_cases.merge(us_deaths, on=_KEY_COLUMNS + [DATE_COLUMN_NAME])
+    jh_data = _standardise(jh_global_cases.drop(_DROP_GLOBAL_COLUMNS, axis='columns'),
+                           jh_global_deaths.drop(_DROP_GLOBAL_COLUMNS, axis='columns'))
+    us_data = _standardise(_convert_us_data(jh_us_cases), _convert_us_data(jh_us_deaths))
 
-    jh_data = jh_cases.merge(jh_deaths, on=_KEY_COLUMNS + [DATE_COLUMN_NAME])
     # Drop global US numbers to use state-level from the US dataset instead
-    jh_data = jh_data.query('Country_Region != "US"')  
-    jh_data = pd.concat([jh_data, us_data], axis=0)
-    jh_data = jh_data.merge(jh_lookup[_LOOKUP_COLUMNS + _KEY_COLUMNS], on=_KEY_COLUMNS, how='inner')
+    jh_data = jh_data.select(jh_data.regions.Country_Region != 'US')
+    jh_data = RegionTimeSeries.concat([jh_data, us_data])
+
+    regions = (jh_data.regions.reset_index()
+               .merge(jh_lookup[_LOOKUP_COLUMNS + _KEY_COLUMNS], on=_KEY_COLUMNS, how='inner'))
+    jh_data = jh_data.take(regions['index'].to_numpy())
+    jh_data.regions = regions.drop('index', axis='columns')
 
     return jh_data
 
@@ -88,6 +99,28 @@ class JohnsHopkins:
 
     def get_data(self) -> pd.DataFrame:
         """
-        Returns the dataset as Pandas dataframe
+        Returns the dataset as Pandas dataframe in long format, with a row per region and date
+        """
+        return JohnsHopkins._data.to_long()
+
+    def get_series(self) -> RegionTimeSeries:
+        """
+        Returns the dataset as region x date matrices of total cases and deaths.
+        This is much smaller than the long format, and can be sliced by date, summed by country (column iso3)
+        and differenced to daily new counts without building the long format.
         """
         return JohnsHopkins._data
+
+    def get_country_data(self, start=None, end=None) -> pd.DataFrame:
+        """
+        Returns total and new cases and deaths per country in long format.
+
+        :param start: If given, the first date to return
+        :param end: If given, the last date to return
+        """
+        return (JohnsHopkins._data
+                .sum_by('iso3', attributes=['Population'])
+                .with_new_from_cumulative({'total_cases': 'new_cases', 'total_deaths': 'new_deaths'})
+                .slice_dates(start, end)
+                .to_long()
+                .rename(columns={'iso3': ISO_COLUMN_NAME}))
@@ -1,6 +1,7 @@
 import pandas as pd
 import logging
 from .constants import *
+from . import cache, instrumentation
 _log = logging.getLogger(__name__)
 
 _MASK_POLICY_PATH = 'https://raw.githubusercontent.com/rs-delve/covid19_datasets/master/data/mask_policy_dates.csv'
@@ -9,9 +10,10 @@ COLUMN_NAMES = {
     'Stringency': 'npi_masks'
 }
 
+@instrumentation.instrumented()
 def _load_dataset() -> pd.DataFrame:
     _log.info(f'Loading dataset from {_MASK_POLICY_PATH}')
-    df = pd.read_csv(_MASK_POLICY_PATH)
+    df = cache.read_csv(_MASK_POLICY_PATH)
     df.DATE = pd.to_datetime(df.DATE, format='%d/%m/%Y')
     # There are some duplicates in the underlying CSV, remove them:
     df = df.groupby([ISO_COLUMN_NAME, DATE_COLUMN_NAME]).first().reset_index()
@@ -1,7 +1,15 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
 import pycountry
 import pandas as pd
 import logging
 from .constants import *
+from . import cache, instrumentation
 _log = logging.getLogger(__name__)
 
 
@@ -18,24 +26,149 @@ COLUMN_NAMES = {
 
 _NORMALISE_COLUMNS = COLUMN_NAMES.values()
 
+_DROP_COLUMNS = ['country_region', 'sub_region_2']  # Not needed for country level data, so they are not parsed
+_CHUNK_ROWS = 200000
 
+_ALPHA_3 = {country.alpha_2: country.alpha_3 for country in pycountry.countries}
+
+
+def _read_country_rows() -> pd.DataFrame:
+    """Read the country level rows of the report in chunks, so that sub-regions are never all in memory."""
+    chunks = []
+    with cache.read_csv(_MOBILITY_PATH, usecols=lambda c: c not in _DROP_COLUMNS, chunksize=_CHUNK_ROWS) as reader:
+        for chunk in reader:
+            chunks.append(chunk[chunk['sub_region_1'].isnull() & chunk['metro_area'].isnull()])
+    return pd.concat(chunks).drop('sub_region_1', axis='columns')
+
+
+@instrumentation.instrumented()
 def _load_dataset():
     _log.info(f'Loading data from {_MOBILITY_PATH}')
-    raw = pd.read_csv(_MOBILITY_PATH)
-    mob_rep_data = raw.rename(columns={'date': DATE_COLUMN_NAME})
+    mob_rep_data = _read_country_rows()
+    mob_rep_data = mob_rep_data.rename(columns={'date': DATE_COLUMN_NAME})
     mob_rep_data[DATE_COLUMN_NAME] = pd.to_datetime(mob_rep_data[DATE_COLUMN_NAME])
-    mob_rep_data = mob_rep_data[(mob_rep_data["sub_region_1"].isnull()) & (mob_rep_data["metro_area"].isnull())]
     mob_rep_data = mob_rep_data.rename(columns=COLUMN_NAMES)
-    mob_rep_data = mob_rep_data.drop(['sub_region_1', 'sub_region_2', 'country_region'], axis=1)
     mob_rep_data = mob_rep_data.dropna(subset=['country_region_code'])
 
-    mob_rep_data[ISO_COLUMN_NAME] = mob_rep_data.country_region_code.apply(lambda c: pycountry.countries.get(alpha_2=c).alpha_3)
+    mob_rep_data[ISO_COLUMN_NAME] = mob_rep_data.country_region_code.map(_ALPHA_3)
 
     mob_rep_data = mob_rep_data.drop('country_region_code', axis='columns')
     _log.info('Loaded')
     return mob_rep_data
 
 
+REGION_LEVELS = ['sub_region_1', 'sub_region_2', 'metro_area']
+
+_REGIONS_DIRNAME = 'mobility_regions'
+_MANIFEST_FILENAME = 'manifest.json'
+_REGION_ID_COLUMNS = ['sub_region_1', 'sub_region_2', 'metro_area', 'iso_3166_2_code', 'census_fips_code', 'place_id']
+
+_regions_lock = threading.Lock()
+
+
+def _regions_dir() -> str:
+    return os.path.join(cache.cache_dir(), _REGIONS_DIRNAME)
+
+
+def _partition_name(iso: str, level: str) -> str:
+    return f'{iso}_{level}'
+
+
+def _partition_path(name: str) -> str:
+    return os.path.join(_regions_dir(), f'{name}.parquet')
+
+
+def _read_manifest() -> dict:
+    try:
+        with open(os.path.join(_regions_dir(), _MANIFEST_FILENAME), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {'report': None, 'columns': [], 'partitions': {}}
+
+
+def _write_manifest(manifest: dict):
+    fd, tmp_path = tempfile.mkstemp(dir=_regions_dir(), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(_regions_dir(), _MANIFEST_FILENAME))
+
+
+def _region_level(chunk: pd.DataFrame) -> np.ndarray:
+    """The most detailed region level of every row, None for country level rows."""
+    return np.select(
+        [chunk['metro_area'].notnull(), chunk['sub_region_2'].notnull(), chunk['sub_region_1'].notnull()],
+        ['metro_area', 'sub_region_2', 'sub_region_1'],
+        default=None)
+
+
+def _split_report(path: str, pieces_dir: str) -> list:
+    """
+    Stream the report into one file per chunk and partition, returning the columns of the region data.
+    Only a single chunk is held in memory at a time.
+    """
+    # Namibia's code is NA, so only empty fields are missing values
+    reader = pd.read_csv(path, usecols=lambda c: c != 'country_region', chunksize=_CHUNK_ROWS,
+                         keep_default_na=False, na_values=[''],
+                         dtype={c: str for c in _REGION_ID_COLUMNS + ['country_region_code']})
+    columns = []
+    with reader:
+        for number, chunk in enumerate(reader):
+            chunk['level'] = _region_level(chunk)
+            chunk = chunk[chunk.level.notnull()]
+            chunk = chunk.rename(columns=dict(COLUMN_NAMES, date=DATE_COLUMN_NAME))
+            chunk.insert(0, ISO_COLUMN_NAME, chunk.pop('country_region_code').map(_ALPHA_3))
+            chunk[DATE_COLUMN_NAME] = pd.to_datetime(chunk[DATE_COLUMN_NAME])
+            columns = [c for c in chunk.columns if c != 'level']
+            for (iso, level), rows in chunk.groupby([ISO_COLUMN_NAME, 'level']):
+                piece_dir = os.path.join(pieces_dir, _partition_name(iso, level))
+                os.makedirs(piece_dir, exist_ok=True)
+                rows.drop('level', axis='columns').to_parquet(os.path.join(piece_dir, f'{number:06d}.parquet'), index=False)
+    return columns
+
+
+def _partition_hash(df: pd.DataFrame) -> str:
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+
+def _update_region_partitions():
+    """
+    Split the report into regional partitions by country and region level, if it changed since the last split.
+    Partitions whose content did not change are left as they are.
+    """
+    with _regions_lock:
+        path = cache.fetch(_MOBILITY_PATH)
+        report = os.path.basename(path)  # Cached files are named by the hash of their content
+        os.makedirs(_regions_dir(), exist_ok=True)
+        manifest = _read_manifest()
+        if manifest['report'] == report:
+            return
+
+        _log.info('Splitting mobility report into regional partitions')
+        previous = manifest['partitions']
+        partitions = {}
+        pieces_dir = tempfile.mkdtemp(dir=_regions_dir())
+        try:
+            columns = _split_report(path, pieces_dir)
+            for name in sorted(os.listdir(pieces_dir)):
+                piece_dir = os.path.join(pieces_dir, name)
+                df = pd.concat([pd.read_parquet(os.path.join(piece_dir, piece))
+                                for piece in sorted(os.listdir(piece_dir))], ignore_index=True)
+                partitions[name] = {'hash': _partition_hash(df), 'rows': len(df)}
+                if previous.get(name, {}).get('hash') != partitions[name]['hash'] or \
+                        not os.path.exists(_partition_path(name)):
+                    df.to_parquet(_partition_path(name) + '.tmp', index=False)
+                    os.replace(_partition_path(name) + '.tmp', _partition_path(name))
+        finally:
+            shutil.rmtree(pieces_dir)
+
+        for name in set(previous) - set(partitions):
+            if os.path.exists(_partition_path(name)):
+                os.remove(_partition_path(name))
+        changed = sum(previous.get(name, {}).get('hash') != p['hash'] for name, p in partitions.items())
+        _log.info(f'Updated {changed} of {len(partitions)} regional partitions')
+        _write_manifest({'report': report, 'columns': columns, 'partitions': partitions})
+
+
 def _normalise(df, column_names):
     result = df.copy()
     for feature_name in column_names:
@@ -51,6 +184,7 @@ class Mobility:
     """
 
     _data = None
+    _regions_checked = False  # Whether the regional partitions are up to date with the report in this session
 
     def __init__(self, force_load: bool = False):
         """
@@ -62,6 +196,7 @@ class Mobility:
         # This is to make sure we only load the dataset once during a single session
         if Mobility._data is None or force_load:
             Mobility._data = _load_dataset()
+            Mobility._regions_checked = False
 
     def get_data(self, normalise=False) -> pd.DataFrame:
         """
@@ -74,3 +209,26 @@ class Mobility:
             return _normalise(Mobility._data, _NORMALISE_COLUMNS)
         else:
             return Mobility._data
+
+    def get_region_data(self, iso: str, level: str = 'sub_region_1') -> pd.DataFrame:
+        """
+        Returns the mobility data of the regions of a country.
+        The first call in a session splits the report into per-country partitions in the cache directory,
+        if it changed since the last split. Further calls only read the partition they need.
+
+        :param iso: ISO code of the country
+        :param level: Region level, one of REGION_LEVELS. sub_region_1 is states or provinces,
+                      sub_region_2 is counties or districts, metro_area is metropolitan areas.
+        """
+        if level not in REGION_LEVELS:
+            raise ValueError(f'Unknown region level {level}, expecting one of {REGION_LEVELS}')
+
+        if not Mobility._regions_checked:
+            _update_region_partitions()
+            Mobility._regions_checked = True
+
+        name = _partition_name(iso, level)
+        manifest = _read_manifest()
+        if name not in manifest['partitions']:
+            return pd.DataFrame(columns=manifest['columns'])
+        return pd.read_parquet(_partition_path(name))
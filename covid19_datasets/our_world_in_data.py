@@ -1,8 +1,9 @@
-from typing import Callable
 import pandas as pd
 import numpy as np
 import logging
 from .constants import *
+from . import cache, instrumentation
+from .utils import days_since
 _log = logging.getLogger(__name__)
 
 _OWID_PATH = 'https://covid.ourworldindata.org/data/owid-covid-data.csv'
@@ -60,60 +61,55 @@ _ZERO_FILL_GAPS_COLUMNS = [  # Zero fill gaps created by "holes" in dates
 ]
 
 
-def _fill_gaps(series, ffill=True):
-    series = series.copy()
-    non_nans = series[~series.apply(np.isnan)]
+def _add_days_since(df: pd.DataFrame) -> pd.DataFrame:
+    """Calculate number of days since first case and first death."""
+    days = days_since(df, ['total_cases', 'total_deaths'])
+    df['days_since_first_case'] = days['total_cases']
+    df['days_since_first_death'] = days['total_deaths']
+    return df
 
-    if non_nans.empty:
-        return series
 
-    start, end = non_nans.index[0], non_nans.index[-1]
-    if ffill:
-        series.loc[start:end] = series.loc[start:end].fillna(method='ffill')
-    else:
-        series.loc[start:end] = series.loc[start:end].fillna(0.)
-    return series
+def _full_index(df: pd.DataFrame) -> pd.MultiIndex:
+    """Index with every date between the first and last date of each country."""
+    date_range = df.groupby(ISO_COLUMN_NAME)[DATE_COLUMN_NAME].agg(['min', 'max'])
+    lengths = (date_range['max'] - date_range['min']).dt.days.to_numpy() + 1
+    starts = np.repeat(date_range['min'].to_numpy(), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return pd.MultiIndex.from_arrays(
+        [np.repeat(date_range.index.to_numpy(), lengths), starts + offsets.astype('timedelta64[D]')],
+        names=[ISO_COLUMN_NAME, DATE_COLUMN_NAME])
 
 
-def _compute_anchor(col: str) -> Callable[[pd.DataFrame], pd.Timestamp]:
-    def _apply(rows: pd.DataFrame) -> pd.Timestamp:
-        anchor = rows.query(f'{col} > 0')
-        if len(anchor) > 0:
-            anchor = anchor.iloc[0].DATE 
-        else:
-            anchor = rows.DATE.max()
-        return anchor
-    return _apply
+def _inside_valid(df: pd.DataFrame) -> pd.DataFrame:
+    """Mask of the rows between the first and last valid value of each country, for every column."""
+    valid = df.notna().astype(int)
+    seen = valid.groupby(level=0).cumsum()
+    total = valid.groupby(level=0).transform('sum')
+    return (seen > 0) & (seen - valid < total)
 
 
-def _add_days_since(df: pd.DataFrame) -> pd.DataFrame:
-    """Calculate number of days since first case and first death."""
-    first_cases = df.groupby('ISO').apply(_compute_anchor('total_cases')).reset_index().rename(columns={0: 'first_case'})
-    first_deaths = df.groupby('ISO').apply(_compute_anchor('total_deaths')).reset_index().rename(columns={0: 'first_death'})
-    df = df.merge(first_cases, on='ISO').merge(first_deaths, on='ISO')
-    df['days_since_first_case'] = (df.DATE - df.first_case).dt.days
-    df['days_since_first_death'] = (df.DATE - df.first_death).dt.days
-    df = df.drop(['first_case', 'first_death'], axis='columns')
-    return df
+def _fill_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """Ensure that dates are contiguous for every country."""
+    df = df.dropna(subset=[ISO_COLUMN_NAME])
+    df = df.set_index([ISO_COLUMN_NAME, DATE_COLUMN_NAME]).reindex(_full_index(df))
+
+    # Static reference data, so we can forward and backward fill
+    fill_columns = [c for c in _FILL_COLUMNS if c != ISO_COLUMN_NAME]
+    filled = df[fill_columns].groupby(level=0).ffill()
+    df[fill_columns] = filled.groupby(level=0).bfill()
 
+    # Fill gaps created by "holes" in dates, between the first and last value of each country
+    gaps = df[_FFILL_GAPS_COLUMNS]
+    df[_FFILL_GAPS_COLUMNS] = gaps.mask(_inside_valid(gaps), gaps.ffill())
+    gaps = df[_ZERO_FILL_GAPS_COLUMNS]
+    df[_ZERO_FILL_GAPS_COLUMNS] = gaps.mask(_inside_valid(gaps), gaps.fillna(0.))
 
-def _fill_dates(rows):
-    """Ensure that dates are contiguous."""
-    rows = rows.set_index(DATE_COLUMN_NAME)
-    rows = rows.reindex(pd.date_range(rows.index.min(), rows.index.max(), freq='D'))
-    # Forward fill certain columns
-    
-    rows.loc[:, _FILL_COLUMNS] = rows.loc[:, _FILL_COLUMNS].ffill().bfill()
-    for col in _FFILL_GAPS_COLUMNS:
-        rows.loc[:, col] = _fill_gaps(rows.loc[:, col], ffill=True)
-    for col in _ZERO_FILL_GAPS_COLUMNS:
-        rows.loc[:, col] = _fill_gaps(rows.loc[:, col], ffill=False)
-    
-    return rows.drop(ISO_COLUMN_NAME, axis='columns')
+    return df.reset_index()
 
 
+@instrumentation.instrumented()
 def _load_covid19_raw() -> pd.DataFrame:
-    df = pd.read_csv(_OWID_PATH)
+    df = cache.read_csv(_OWID_PATH)
     df = df.rename(columns={
         'iso_code': ISO_COLUMN_NAME,
         'date': DATE_COLUMN_NAME
@@ -122,10 +118,11 @@ def _load_covid19_raw() -> pd.DataFrame:
     return df
 
 
+@instrumentation.instrumented()
 def _load_covid19_dataset() -> pd.DataFrame:
     _log.info(f'Loading dataset from {_OWID_PATH}')
     df = _load_covid19_raw()
-    df = df.groupby(ISO_COLUMN_NAME).apply(_fill_dates).reset_index().rename(columns={'level_1': DATE_COLUMN_NAME})
+    df = _fill_dates(df)
     df = _add_days_since(df)
     _log.info('Loaded')
     return df
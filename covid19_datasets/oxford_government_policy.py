@@ -1,6 +1,8 @@
+import numpy as np
 import pandas as pd
 import re
 from .constants import *
+from . import cache, instrumentation
 
 import logging
 _log = logging.getLogger(__name__)
@@ -27,9 +29,10 @@ COLUMN_NAMES = {
     'StringencyIndex': 'npi_stringency_index'
 }
 
+@instrumentation.instrumented()
 def _load_dataset() -> pd.DataFrame:
     _log.info(f'Loading dataset from {_OXFORD_PATH}')
-    oxford_df = pd.read_csv(_OXFORD_PATH)
+    oxford_df = cache.read_csv(_OXFORD_PATH)
     oxford_df[DATE_COLUMN_NAME] = pd.to_datetime(oxford_df.Date.astype(str))
     oxford_df = oxford_df[oxford_df.RegionCode.isna()]  # Filter to country level data only
     df = oxford_df[[c for c in oxford_df.columns if 'Notes' not in c and 'Flag' not in c and 'Unnamed' not in c]].drop(['Date', 'StringencyIndexForDisplay', 'M1_Wildcard', 'RegionName', 'RegionCode'], axis='columns')
@@ -41,12 +44,45 @@ def _load_dataset() -> pd.DataFrame:
     _log.info("Loaded")
     return df.rename(columns=COLUMN_NAMES)
 
+
+def _index_countries(df: pd.DataFrame) -> (pd.DataFrame, dict):
+    """
+    Makes the rows of each country contiguous and returns the data with the row ranges of each country,
+    keyed by both ISO code and country name.
+    """
+    codes, _ = pd.factorize(df[ISO_COLUMN_NAME])
+    if (np.diff(codes) != 0).sum() + 1 > codes.max(initial=0) + 1:
+        # Countries appear in the order of their first row, and keep the order of their own rows
+        df = df.iloc[np.argsort(codes, kind='stable')]
+        codes = np.sort(codes, kind='stable')
+
+    starts = np.flatnonzero(np.diff(codes, prepend=-1) != 0)
+    stops = np.append(starts[1:], len(codes))
+    rows = {}
+    for start, stop in zip(starts, stops):
+        for key in {df[ISO_COLUMN_NAME].iat[start], df['CountryName'].iat[start]}:
+            rows.setdefault(key, []).append(slice(start, stop))
+    return df, rows
+
+
+def _policy_changes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Flags the values that differ from the previous day, for data sorted by date within each country.
+    The first day of each country has no previous day and is left out.
+    """
+    df = df.drop(['ConfirmedCases', 'ConfirmedDeaths'], axis='columns')
+    changes = (df != df.shift(1)) & ~df.isna()
+    first_days = df[ISO_COLUMN_NAME] != df[ISO_COLUMN_NAME].shift(1)
+    return changes[~first_days]
+
+
 class OxfordGovernmentPolicyDataset:
     """
     Oxford COVID-19 government policy dataset
     """
     
     data = None
+    _country_rows = None
 
     def __init__(self, force_load=False):
         """
@@ -57,7 +93,8 @@ class OxfordGovernmentPolicyDataset:
         """
         # This is to make sure we only load the dataset once during a single session
         if OxfordGovernmentPolicyDataset.data is None or force_load:
-            OxfordGovernmentPolicyDataset.data = _load_dataset()
+            OxfordGovernmentPolicyDataset.data, OxfordGovernmentPolicyDataset._country_rows = \
+                _index_countries(_load_dataset())
 
     def get_data(self) -> pd.DataFrame:
         """
@@ -72,7 +109,10 @@ class OxfordGovernmentPolicyDataset:
 
         :param country_or_iso: Name or ISO code of the country
         """
-        return self.data.query(f'CountryName == "{country_or_iso}" or ISO == "{country_or_iso}"')
+        rows = OxfordGovernmentPolicyDataset._country_rows.get(country_or_iso, [slice(0, 0)])
+        if len(rows) == 1:
+            return self.data.iloc[rows[0]]
+        return self.data.iloc[np.r_[tuple(rows)]]
 
 
     def get_country_policy_changes(self, country_or_iso) -> pd.DataFrame:
@@ -90,3 +130,13 @@ class OxfordGovernmentPolicyDataset:
         policy_changes = ((country_df != country_df.shift(1)) & ~country_df.isna()).iloc[1:]
         
         return policy_changes
+
+    def get_all_policy_changes(self) -> pd.DataFrame:
+        """
+        Policy changes of every country, computed in one pass.
+        The same as get_country_policy_changes for each country, indexed by ISO code and date.
+
+        :returns: Pandas dataframe of policy changes
+        """
+        policy_changes = _policy_changes(self.data.set_index([ISO_COLUMN_NAME, DATE_COLUMN_NAME], drop=False))
+        return policy_changes.drop([ISO_COLUMN_NAME, DATE_COLUMN_NAME], axis='columns')
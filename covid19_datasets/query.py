@@ -0,0 +1,83 @@
+"""
+Fast selection of countries and date ranges from a dataset indexed by ISO and date.
+
+The rows are sorted by ISO then date once, and the first and last row of every country are recorded. A query then
+costs a dictionary lookup and a binary search per country, instead of a boolean mask over the whole dataset or a
+lookup in an unsorted MultiIndex.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .constants import ISO_COLUMN_NAME, DATE_COLUMN_NAME
+
+
+class IndexedDataset:
+    """
+    Dataset indexed by ISO and date, sorted for fast selection.
+    """
+
+    def __init__(self, data: pd.DataFrame):
+        """
+        :param data: Dataframe indexed by ISO and date, such as the combined dataset.
+                     It is only copied if it is not sorted already.
+        """
+        if not data.index.is_monotonic_increasing:
+            data = data.sort_index(kind='mergesort')
+        self.data = data
+
+        isos = data.index.get_level_values(ISO_COLUMN_NAME).to_numpy()
+        self._dates = data.index.get_level_values(DATE_COLUMN_NAME).to_numpy()
+        starts = np.flatnonzero(np.concatenate([[True], isos[1:] != isos[:-1]])) if len(isos) else np.array([], int)
+        stops = np.append(starts[1:], len(isos))
+        self._offsets = {iso: (start, stop) for iso, start, stop in zip(isos[starts], starts, stops)}
+
+    @property
+    def isos(self) -> list:
+        """ISO codes of the countries in the dataset, sorted."""
+        return list(self._offsets)
+
+    def _rows(self, iso, start, end) -> tuple:
+        try:
+            begin, stop = self._offsets[iso]
+        except KeyError:
+            raise KeyError(f'Unknown ISO code {iso}') from None
+        dates = self._dates[begin:stop]
+        if start is not None:
+            begin += dates.searchsorted(pd.Timestamp(start).to_datetime64(), side='left')
+        if end is not None:
+            stop -= len(dates) - dates.searchsorted(pd.Timestamp(end).to_datetime64(), side='right')
+        return begin, max(begin, stop)
+
+    def select(self, isos=None, start=None, end=None, columns: list = None) -> pd.DataFrame:
+        """
+        Returns the rows of the given countries between two dates.
+        The result is a view of the dataset, not a copy, when it is a single block of rows with all columns,
+        e.g. one country or all countries without dates. Do not modify it.
+
+        :param isos: ISO code or list of codes, in the order of the result. All countries if None.
+        :param start: First date, included. No limit if None.
+        :param end: Last date, included. No limit if None.
+        :param columns: Columns to return, all columns if None
+        """
+        isos = self._offsets if isos is None else [isos] if isinstance(isos, str) else isos
+        ranges = []
+        for iso in isos:
+            begin, stop = self._rows(iso, start, end)
+            if ranges and ranges[-1][1] == begin:
+                ranges[-1] = (ranges[-1][0], stop)
+            elif stop > begin:
+                ranges.append((begin, stop))
+
+        if len(ranges) <= 1:
+            begin, stop = ranges[0] if ranges else (0, 0)
+            rows = slice(begin, stop)
+        else:
+            rows = np.concatenate([np.arange(begin, stop) for begin, stop in ranges])
+
+        if columns is None:
+            return self.data.iloc[rows]
+        positions = self.data.columns.get_indexer(columns)
+        if (positions < 0).any():
+            raise KeyError(f'Unknown columns: {[c for c, p in zip(columns, positions) if p < 0]}')
+        return self.data.iloc[rows, positions]
@@ -0,0 +1,207 @@
+"""
+Sharing a built dataset between processes through memory-mapped files.
+
+The publishing process writes the columns to uncompressed .npy files, by default in shared memory (/dev/shm)
+where it is available. Columns of the same numeric type are stored together as one matrix, laid out as pandas
+keeps them in memory, and nullable integer and categorical columns in files of their own. Other processes attach
+to it: every file is memory-mapped read-only and becomes a block of the dataframe as it is, so the operating
+system keeps a single copy of the data however many processes use it.
+
+Text columns and the index are rebuilt in each process, as Python objects cannot be shared, which is small next
+to the numeric columns.
+"""
+
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from pandas.core.internals import BlockManager
+from pandas.core.internals.api import make_block
+
+from . import instrumentation
+
+import logging
+_log = logging.getLogger(__name__)
+
+
+_SHARED_MEMORY_DIR = '/dev/shm'
+_PREFIX = 'covid19_datasets_'
+_META_FILENAME = 'meta.json'
+_MASKED_ARRAYS = (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)
+
+
+def _default_dir() -> str:
+    return _SHARED_MEMORY_DIR if os.path.isdir(_SHARED_MEMORY_DIR) else tempfile.gettempdir()
+
+
+def _save(directory: str, name: str, values: np.ndarray):
+    np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(values), allow_pickle=False)
+
+
+def _load(directory: str, name: str) -> np.ndarray:
+    return np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+
+
+def _write_values(directory: str, name: str, values) -> dict:
+    """Writes the values of a column or index level, returning its description."""
+    dtype = values.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        _save(directory, name, values.codes)
+        return {'kind': 'categorical', 'categories': values.categories.tolist(), 'ordered': dtype.ordered}
+    if isinstance(values, _MASKED_ARRAYS):
+        _save(directory, name, values._data)
+        _save(directory, f'{name}_mask', values._mask)
+        return {'kind': 'masked', 'dtype': dtype.name}
+    if pd.api.types.is_object_dtype(dtype):
+        codes, categories = pd.factorize(np.asarray(values))
+        _save(directory, name, codes)
+        return {'kind': 'object', 'categories': categories.tolist()}
+    _save(directory, name, np.asarray(values))
+    return {'kind': 'numpy'}
+
+
+def _read_values(directory: str, name: str, description: dict):
+    values = _load(directory, name)
+    if description['kind'] == 'categorical':
+        return pd.Categorical.from_codes(values, description['categories'], ordered=description['ordered'])
+    if description['kind'] == 'masked':
+        array_type = pd.api.types.pandas_dtype(description['dtype']).construct_array_type()
+        return array_type(values, _load(directory, f'{name}_mask'))
+    if description['kind'] == 'object':
+        return pd.Categorical.from_codes(values, description['categories']).astype(object)
+    return values
+
+
+def _write_blocks(directory: str, df: pd.DataFrame) -> list:
+    """
+    Writes the columns of a dataframe, returning the description of each block with the positions of its columns.
+    Numpy columns are grouped by dtype, other columns are written one by one.
+    """
+    groups = {}
+    blocks = []
+    for i, dtype in enumerate(df.dtypes):
+        if isinstance(dtype, np.dtype) and dtype != object:
+            groups.setdefault(dtype.str, []).append(i)
+        else:
+            blocks.append({'placement': [i]})
+    blocks.extend({'kind': 'numpy', 'placement': placement} for placement in groups.values())
+
+    for k, block in enumerate(blocks):
+        name = f'block_{k}'
+        if block.get('kind') == 'numpy':
+            _save(directory, name, np.stack([df.iloc[:, i].to_numpy() for i in block['placement']]))
+        else:
+            block.update(_write_values(directory, name, df.iloc[:, block['placement'][0]].array))
+    return blocks
+
+
+def _read_blocks(directory: str, blocks: list) -> list:
+    result = []
+    objects = []
+    for k, block in enumerate(blocks):
+        name = f'block_{k}'
+        if block['kind'] == 'numpy':
+            result.append(make_block(_load(directory, name), block['placement']))
+        elif block['kind'] == 'object':
+            objects.append((block['placement'][0], _read_values(directory, name, block)))
+        else:
+            result.append(make_block(_read_values(directory, name, block), block['placement'], ndim=2))
+    if objects:
+        # Text columns are rebuilt in memory anyway, so they are kept together as pandas would
+        result.append(make_block(np.vstack([values for _, values in objects]), [i for i, _ in objects]))
+    return result
+
+
+def _from_blocks(blocks: list, columns: pd.Index, index: pd.Index) -> pd.DataFrame:
+    manager = BlockManager(blocks, [columns, index])
+    if hasattr(pd.DataFrame, '_from_mgr'):
+        return pd.DataFrame._from_mgr(manager, axes=manager.axes)
+    return pd.DataFrame(manager)
+
+
+@instrumentation.instrumented()
+def publish(df: pd.DataFrame, path: str = None) -> str:
+    """
+    Writes a dataset for other processes to attach to, returning its path.
+    Publishing again to the same path replaces the dataset; processes already attached keep the previous one.
+
+    :param df: The dataset, such as Combined().get_data()
+    :param path: Directory to write to. By default, a new directory in shared memory if available,
+                 otherwise in the temporary directory.
+    """
+    if path is None:
+        path = tempfile.mkdtemp(prefix=_PREFIX, dir=_default_dir())
+    path = os.path.abspath(path)
+    directory = tempfile.mkdtemp(prefix=_PREFIX, dir=os.path.dirname(path))
+    try:
+        meta = {
+            'columns': df.columns.tolist(),
+            'blocks': _write_blocks(directory, df),
+            'index': [dict(_write_values(directory, f'index_{i}', df.index.get_level_values(i).array), name=name)
+                      for i, name in enumerate(df.index.names)],
+        }
+        with open(os.path.join(directory, _META_FILENAME), 'w') as f:
+            json.dump(meta, f)
+
+        # Swap the directories, so that attaching never sees a partly written dataset
+        previous = None
+        if os.path.exists(path):
+            previous = tempfile.mkdtemp(prefix=_PREFIX, dir=os.path.dirname(path))
+            os.replace(path, os.path.join(previous, 'dataset'))
+        os.replace(directory, path)
+        if previous is not None:
+            shutil.rmtree(previous, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+    _log.info(f'Published {len(df)} rows to {path}')
+    return path
+
+
+@instrumentation.instrumented()
+def attach(path: str) -> pd.DataFrame:
+    """
+    Returns a read-only dataframe backed by a dataset published with `publish`.
+
+    :param path: Path returned by `publish`
+    """
+    with open(os.path.join(path, _META_FILENAME), 'r') as f:
+        meta = json.load(f)
+
+    levels = [_read_values(path, f'index_{i}', level) for i, level in enumerate(meta['index'])]
+    names = [level['name'] for level in meta['index']]
+    index = pd.MultiIndex.from_arrays(levels, names=names) if len(levels) > 1 else pd.Index(levels[0], name=names[0])
+
+    # The blocks are used as they are, building the frame any other way would copy them into new blocks
+    return _from_blocks(_read_blocks(path, meta['blocks']), pd.Index(meta['columns']), index)
+
+
+def remove(path: str):
+    """
+    Deletes a published dataset. Processes already attached to it can keep using it.
+
+    :param path: Path returned by `publish`
+    """
+    shutil.rmtree(path, ignore_errors=True)
+    _log.info(f'Removed {path}')
+
+
+@contextlib.contextmanager
+def published(df: pd.DataFrame, path: str = None):
+    """
+    Context manager publishing a dataset, yielding its path, and removing it on exit.
+    Start the worker processes inside the block and pass them the path.
+
+    :param df: The dataset
+    :param path: Directory to write to, see `publish`
+    """
+    path = publish(df, path)
+    try:
+        yield path
+    finally:
+        remove(path)
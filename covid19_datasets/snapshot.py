@@ -0,0 +1,93 @@
+"""
+Columnar snapshots of the combined dataset.
+
+Snapshots are Parquet files with an explicit schema, sorted by ISO and DATE
+so that readers can load only the columns and row groups they need.
+"""
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .constants import *
+from . import instrumentation
+
+import logging
+_log = logging.getLogger(__name__)
+
+
+_COMPRESSION = 'zstd'
+_ROW_GROUP_SIZE = 16384  # Roughly 50 countries per row group
+_STRING_COLUMNS = ['country_name']
+
+
+def _field(df: pd.DataFrame, column: str) -> pa.Field:
+    if column in [ISO_COLUMN_NAME] + _STRING_COLUMNS:
+        return pa.field(column, pa.dictionary(pa.int16(), pa.string()))
+    if column == DATE_COLUMN_NAME:
+        return pa.field(column, pa.timestamp('ns'), nullable=False)
+    if pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column]):
+        return pa.field(column, pa.float64())
+    return pa.field(column, pa.string())
+
+
+def snapshot_schema(df: pd.DataFrame) -> pa.Schema:
+    """
+    Returns the Parquet schema used to store a dataframe with ISO and DATE columns.
+    Country identifiers are dictionary encoded, dates are timestamps and numeric values are doubles.
+    """
+    return pa.schema([_field(df, column) for column in df.columns])
+
+
+@instrumentation.instrumented()
+def write_snapshot(df: pd.DataFrame, path: str, compression: str = _COMPRESSION, row_group_size: int = _ROW_GROUP_SIZE):
+    """
+    Writes a dataset indexed by ISO and DATE (such as Combined().get_data()) to a Parquet file.
+
+    :param df: The dataset
+    :param path: Output path
+    :param compression: Parquet compression codec
+    :param row_group_size: Number of rows per row group
+    """
+    df = df.reset_index().sort_values([ISO_COLUMN_NAME, DATE_COLUMN_NAME], kind='mergesort')
+    table = pa.Table.from_pandas(df, schema=snapshot_schema(df), preserve_index=False)
+    pq.write_table(table, path, compression=compression, row_group_size=row_group_size)
+    _log.info(f'Wrote snapshot of {len(df)} rows to {path}')
+
+
+def snapshot_columns(path: str) -> list:
+    """
+    Returns the names of the columns stored in a snapshot, excluding ISO and DATE.
+    """
+    return [c for c in pq.read_schema(path).names if c not in (ISO_COLUMN_NAME, DATE_COLUMN_NAME)]
+
+
+@instrumentation.instrumented()
+def read_snapshot(path: str, columns: list = None, isos: list = None, start=None, end=None) -> pd.DataFrame:
+    """
+    Reads a snapshot written by write_snapshot, returning a dataframe indexed by ISO and DATE.
+    Only the requested columns and the row groups that can match the filters are read.
+
+    :param path: Path of the Parquet file
+    :param columns: Columns to read, all columns if None
+    :param isos: ISO codes of the countries to read, all countries if None
+    :param start: First date to read (inclusive)
+    :param end: Last date to read (inclusive)
+    """
+    if columns is not None:
+        columns = [ISO_COLUMN_NAME, DATE_COLUMN_NAME] + [c for c in columns if c not in (ISO_COLUMN_NAME, DATE_COLUMN_NAME)]
+
+    filters = []
+    if isos is not None:
+        filters.append((ISO_COLUMN_NAME, 'in', list(isos)))
+    if start is not None:
+        filters.append((DATE_COLUMN_NAME, '>=', pd.Timestamp(start)))
+    if end is not None:
+        filters.append((DATE_COLUMN_NAME, '<=', pd.Timestamp(end)))
+
+    table = pq.read_table(path, columns=columns, filters=filters or None)
+    df = table.to_pandas()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
+    return df.set_index([ISO_COLUMN_NAME, DATE_COLUMN_NAME])
@@ -0,0 +1,186 @@
+"""
+Time series of many regions kept as region x date matrices.
+
+Wide sources, such as the Johns Hopkins time series, have one row per region and one column per date.
+Keeping them in that shape avoids repeating the region columns for every date, and makes aggregation,
+differencing and date slicing plain numpy operations. Long format is only built when asked for.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .constants import DATE_COLUMN_NAME
+
+
+class RegionTimeSeries:
+    """
+    Values of one or more series for every region and date.
+    Row i of every matrix belongs to row i of the regions table, column j to date j.
+    Regions may not all have the same dates, e.g. when stacking sources updated on different days. The cells a
+    region has no value for are then false in the `present` matrix, and hold NaN, or 0 in integer matrices.
+    """
+
+    def __init__(self, regions: pd.DataFrame, dates, values: dict, id_columns: list = None,
+                 present: np.ndarray = None):
+        """
+        :param regions: One row per region, with its identifying columns and other attributes
+        :param dates: Dates of the matrix columns
+        :param values: Series name to matrix of shape (number of regions, number of dates)
+        :param id_columns: Columns of regions that identify a region, all columns if None
+        :param present: Boolean matrix of the cells that have a value, of the same shape. None if all have one.
+        """
+        self.regions = regions.reset_index(drop=True)
+        self.dates = pd.DatetimeIndex(dates, name=DATE_COLUMN_NAME)
+        self.values = values
+        self.id_columns = list(regions.columns) if id_columns is None else id_columns
+        self.present = present
+        shape = (len(self.regions), len(self.dates))
+        for name, matrix in dict(values, present=present).items():
+            if matrix is not None and matrix.shape != shape:
+                raise ValueError(f'Shape of {name} is {matrix.shape}, expecting {shape}')
+
+    def __len__(self):
+        return len(self.regions)
+
+    def _with(self, regions=None, dates=None, values=None, id_columns=None, present=None):
+        return RegionTimeSeries(
+            self.regions if regions is None else regions,
+            self.dates if dates is None else dates,
+            self.values if values is None else values,
+            self.id_columns if id_columns is None else id_columns,
+            self.present if present is None else present)
+
+    def _missing(self, matrix: np.ndarray) -> np.ndarray:
+        """Returns a matrix as floats, with NaN in the cells that have no value."""
+        matrix = matrix.astype(float)
+        if self.present is not None:
+            matrix[~self.present] = np.nan
+        return matrix
+
+    def take(self, rows) -> 'RegionTimeSeries':
+        """Returns the regions at the given positions."""
+        rows = np.asarray(rows)
+        return RegionTimeSeries(self.regions.iloc[rows], self.dates,
+                                {name: matrix[rows] for name, matrix in self.values.items()}, self.id_columns,
+                                None if self.present is None else self.present[rows])
+
+    def select(self, mask) -> 'RegionTimeSeries':
+        """Returns the regions for which the boolean mask, aligned with the regions table, is true."""
+        return self.take(np.flatnonzero(np.asarray(mask)))
+
+    def slice_dates(self, start=None, end=None) -> 'RegionTimeSeries':
+        """
+        Returns the dates between start and end, both included. The matrices are views, not copies.
+        """
+        begin = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), side='left')
+        stop = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), side='right')
+        return RegionTimeSeries(self.regions, self.dates[begin:stop],
+                                {name: matrix[:, begin:stop] for name, matrix in self.values.items()}, self.id_columns,
+                                None if self.present is None else self.present[:, begin:stop])
+
+    def with_new_from_cumulative(self, columns: dict) -> 'RegionTimeSeries':
+        """
+        Adds daily new counts computed from cumulative series. The first date has no previous value, so it is NaN,
+        and so are the dates following one a region has no value for.
+
+        :param columns: Cumulative series name to name of the new series, e.g. {'total_cases': 'new_cases'}
+        """
+        values = dict(self.values)
+        for cumulative, new in columns.items():
+            matrix = self._missing(self.values[cumulative])
+            values[new] = np.concatenate([np.full((len(self), min(1, len(self.dates))), np.nan),
+                                          np.diff(matrix, axis=1)], axis=1)
+        return self._with(values=values)
+
+    def sum_by(self, column: str, attributes: list = ()) -> 'RegionTimeSeries':
+        """
+        Sums the series of all regions with the same value of a region column, e.g. the regions of each country.
+        Missing values count as zero. A group has a value on the dates at least one of its regions has.
+
+        :param column: Region column to group by
+        :param attributes: Numeric region columns to sum as well, e.g. population. Other columns are dropped.
+        """
+        codes, groups = pd.factorize(self.regions[column], sort=True)
+        rows = np.flatnonzero(codes >= 0)
+        rows = rows[np.argsort(codes[rows], kind='stable')]
+        starts = np.flatnonzero(np.diff(codes[rows], prepend=-1) != 0)
+
+        def _sum(matrix):
+            matrix = matrix[rows]
+            if matrix.dtype.kind == 'f':
+                matrix = np.nan_to_num(matrix, nan=0.)
+            if len(rows) == 0:
+                return matrix
+            return np.add.reduceat(matrix, starts, axis=0)
+
+        regions = pd.DataFrame({column: groups})
+        for attribute in attributes:
+            regions[attribute] = _sum(self.regions[attribute].to_numpy())
+        present = None
+        if self.present is not None:
+            present = np.logical_or.reduceat(self.present[rows], starts, axis=0) if len(rows) else self.present[rows]
+        return RegionTimeSeries(regions, self.dates, {name: _sum(matrix) for name, matrix in self.values.items()},
+                                id_columns=[column], present=present)
+
+    def to_long(self) -> pd.DataFrame:
+        """
+        Converts to long format with one row per region and date, sorted by region then date.
+        Regions have no row for the dates they have no value for.
+        Columns are the identifying region columns, the date, the series and the other region attributes.
+        """
+        dates = len(self.dates)
+        data = {c: np.repeat(self.regions[c].to_numpy(), dates) for c in self.id_columns}
+        data[DATE_COLUMN_NAME] = np.tile(self.dates.to_numpy(), len(self))
+        for name, matrix in self.values.items():
+            data[name] = matrix.reshape(-1)
+        for c in self.regions.columns:
+            if c not in self.id_columns:
+                data[c] = np.repeat(self.regions[c].to_numpy(), dates)
+        if self.present is not None:
+            rows = self.present.reshape(-1)
+            data = {c: values[rows] for c, values in data.items()}
+        return pd.DataFrame(data)
+
+    def to_frame(self, name: str) -> pd.DataFrame:
+        """
+        Returns one series as a wide dataframe, indexed by the identifying region columns, with a column per date.
+        Cells a region has no value for are NaN.
+        """
+        index = pd.MultiIndex.from_frame(self.regions[self.id_columns]) if len(self.id_columns) > 1 \
+            else pd.Index(self.regions[self.id_columns[0]])
+        matrix = self.values[name] if self.present is None else self._missing(self.values[name])
+        return pd.DataFrame(matrix, index=index, columns=self.dates)
+
+    @staticmethod
+    def concat(series: list) -> 'RegionTimeSeries':
+        """
+        Stacks the regions of several series. Dates are aligned on their union, and the cells of the dates a series
+        does not have are marked as missing.
+        """
+        dates = series[0].dates
+        for s in series[1:]:
+            if not s.dates.equals(dates):
+                dates = dates.union(s.dates)
+
+        def _align(s, matrix, fill):
+            if s.dates.equals(dates):
+                return matrix
+            aligned = np.full((len(s), len(dates)), fill, dtype=matrix.dtype if matrix.dtype.kind in 'biu' else float)
+            aligned[:, dates.get_indexer(s.dates)] = matrix
+            return aligned
+
+        def _present(s):
+            return np.ones((len(s), len(s.dates)), dtype=bool) if s.present is None else s.present
+
+        present = None
+        if any(s.present is not None or not s.dates.equals(dates) for s in series):
+            present = np.vstack([_align(s, _present(s), False) for s in series])
+
+        names = [name for name in series[0].values if all(name in s.values for s in series)]
+        return RegionTimeSeries(
+            pd.concat([s.regions for s in series], ignore_index=True),
+            dates,
+            {name: np.vstack([_align(s, s.values[name], 0 if s.values[name].dtype.kind in 'biu' else np.nan)
+                              for s in series]) for name in names},
+            id_columns=series[0].id_columns,
+            present=present)
@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 import datetime
 from .constants import DATE_COLUMN_NAME
+from .timeseries import RegionTimeSeries
+from . import cache, instrumentation
 
 import logging
 _log = logging.getLogger(__name__)
@@ -19,24 +21,16 @@ def _backfill_missing_data(df):
     Datasets might have some dates missing if there were no cases reported on these dates
     Backfill them with 0
     """
-    # if there are NaNs, replace them with 0
-    df = df.fillna(0.0)
-
-    # Some dates are missing as there were no numbers reported
-    # backfill them with 0
-    all_days = pd.date_range(df.columns.min(), df.columns.max(), freq='D')
-    missing_days = np.setdiff1d(all_days, df.columns)
-    for missing_day in missing_days:
-        df[missing_day] = 0.0
-
-    df = df[np.sort(df.columns)]
-
-    return df
+    # Some dates are missing as there were no numbers reported, and some areas have no number
+    # on dates reported by other areas: complete the date range and fill both with 0
+    all_days = pd.date_range(df.columns.min(), df.columns.max(), freq='D', name=df.columns.name)
+    return df.reindex(columns=all_days).fillna(0.0)
 
 
+@instrumentation.instrumented()
 def _load_england_cases_dataset(area_type):
     _log.info("Loading dataset from " + ENGLAND_CASES_PATH)
-    df = pd.read_csv(ENGLAND_CASES_PATH)
+    df = cache.read_csv(ENGLAND_CASES_PATH)
     _log.info("Loaded")
 
     df[DATE_COLUMN_NAME] = pd.to_datetime(df["Specimen date"].astype(str))
@@ -55,9 +49,10 @@ def _load_england_cases_dataset(area_type):
     return df
 
 
+@instrumentation.instrumented()
 def _load_wales_datasets():
     _log.info("Loading dataset from " + WALES_PATH)
-    xlsx = pd.ExcelFile(WALES_PATH)
+    xlsx = pd.ExcelFile(cache.fetch(WALES_PATH))
     _log.info("Loaded")
 
     df = pd.read_excel(xlsx, 'Tests by specimen date')
@@ -78,9 +73,10 @@ def _load_wales_datasets():
     return df_cases, df_tests
 
 
+@instrumentation.instrumented()
 def _load_scotland_cases_dataset():
     _log.info("Loading dataset from " + SCOTLAND_PATH)
-    df = pd.read_csv(SCOTLAND_PATH, error_bad_lines=False)
+    df = cache.read_csv(SCOTLAND_PATH, error_bad_lines=False)
     _log.info("Loaded")
 
     # downloaded file is (dates x areas), and we want the opposite
@@ -94,9 +90,10 @@ def _load_scotland_cases_dataset():
 
     df = df.replace('*', 0.0).astype(float)
 
-    # original has cumulative data, and we want new cases per day
-    for i in range(len(df.columns) - 1, 1, -1):
-        df.iloc[:, i] = df.iloc[:, i] - df.iloc[:, i-1]
+    # original has cumulative data, and we want new cases per day.
+    # The first two dates are kept as published, as they always have been.
+    values = df.to_numpy()
+    df.iloc[:, 2:] = values[:, 2:] - values[:, 1:-1]
 
     # set multi index by country and area
     df['Country'] = 'Scotland'
@@ -114,6 +111,7 @@ class UKCovid19Data:
     wales_cases_data = None
     wales_tests_data = None
     scotland_cases_data = None
+    _cases_data = None
     ENGLAND_UPPER_TIER_AUTHORITY = 'utla'
     ENGLAND_LOWER_TIER_AUTHORITY = 'ltla'
 
@@ -127,14 +125,17 @@ class UKCovid19Data:
         if UKCovid19Data.england_cases_data is None or force_load or UKCovid19Data.england_area_type != england_area_type:
             UKCovid19Data.england_area_type = england_area_type
             UKCovid19Data.england_cases_data = _load_england_cases_dataset(england_area_type)
+            UKCovid19Data._cases_data = None
 
         if UKCovid19Data.wales_cases_data is None or UKCovid19Data.wales_tests_data is None or force_load:
             UKCovid19Data.wales_cases_data, UKCovid19Data.wales_tests_data = _load_wales_datasets()
+            UKCovid19Data._cases_data = None
 
         if UKCovid19Data.scotland_cases_data is None or force_load:
             UKCovid19Data.scotland_cases_data = _load_scotland_cases_dataset()
+            UKCovid19Data._cases_data = None
 
-    def get_cases_data(self):
+    def get_cases_data(self, long_format=False):
         """
         Returns the dataset as Pandas dataframe
 
@@ -144,10 +145,16 @@ class UKCovid19Data:
         - Each cell value is a number of new cases registered on that day
 
         Note: Scotland provides data by NHS Board, not by county
-        """
-        df = pd.concat([UKCovid19Data.england_cases_data, UKCovid19Data.wales_cases_data, UKCovid19Data.scotland_cases_data])
-        # in case they have uneven number of columns
-        df = df.fillna(0.0)
-
-        return df
 
+        :param long_format: If true, returns a row per area and date instead, with columns
+                            Country, Area name, DATE and cases_new
+        """
+        if UKCovid19Data._cases_data is None:
+            df = pd.concat([UKCovid19Data.england_cases_data, UKCovid19Data.wales_cases_data, UKCovid19Data.scotland_cases_data])
+            # in case they have uneven number of columns
+            UKCovid19Data._cases_data = df.fillna(0.0)
+
+        df = UKCovid19Data._cases_data
+        if long_format:
+            return RegionTimeSeries(df.index.to_frame(index=False), df.columns, {'cases_new': df.to_numpy()}).to_long()
+        return df.copy()
@@ -4,7 +4,8 @@ import csv
 from calendar import monthrange
 
 from .constants import *
-from .utils import get_country_iso
+from . import cache, instrumentation
+from .utils import country_isos
 
 _log = logging.getLogger(__name__)
 
@@ -30,9 +31,10 @@ def _get_daily_average(row):
     _, days_count = monthrange(row['Year'], months[row['Month']])
     return row['Value'] / days_count
 
+@instrumentation.instrumented()
 def _load_dataset() -> pd.DataFrame:
     _log.info(f'Loading dataset from {_DATA_PATH}')
-    df = pd.read_csv(_DATA_PATH, quotechar='"')
+    df = cache.read_csv(_DATA_PATH, quotechar='"')
 
     # drop unused columns
     df = df.drop(['Record Type', 'Reliability', 'Source Year', 'Value Footnotes'], axis='columns')
@@ -46,7 +48,7 @@ def _load_dataset() -> pd.DataFrame:
     df['Year'] = pd.to_numeric(df['Year'])
     df['Value'] = pd.to_numeric(df['Value'])
     
-    df[ISO_COLUMN_NAME] = df['Country or Area'].apply(get_country_iso)
+    df[ISO_COLUMN_NAME] = country_isos(df['Country or Area'])
     # Drop rows that don't represent valid countries (e.g. territories)
     df = df[pd.notnull(df[ISO_COLUMN_NAME])]
 
@@ -1,40 +1,247 @@
 import datetime
+import functools
+import re
+import threading
+import unicodedata
+import numpy as np
+import pandas as pd
 import pycountry
 
+from .constants import ISO_COLUMN_NAME, DATE_COLUMN_NAME
+from . import cache
+
+import logging
+_log = logging.getLogger(__name__)
+
 
 _ISO_OVERRIDE = {
     'RKS': 'Republic of Kosovo'
 }
 
 
-def get_country_iso(country_name):
-    # Country names in this dataset is a wondeful mix of official and normal names
-    # so we will try looking up by all of that
-    # and a fuzzy search on top
-
-    country = pycountry.countries.get(name=country_name)
-    if country is not None:
-        return country.alpha_3
-    
-    country = pycountry.countries.get(official_name=country_name)
-    if country is not None:
-        return country.alpha_3
-    
+_COUNTRY_ALIASES_PATH = 'https://raw.githubusercontent.com/rs-delve/covid19_datasets/master/data/cia_country_iso_mapping.csv'
+
+_country_index = None
+_country_index_lock = threading.Lock()
+
+
+def _normalise_country_name(name: str) -> str:
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    name = re.sub(r'[^a-z0-9 ]', ' ', name.lower().replace('&', ' and '))
+    return ' '.join(name.split())
+
+
+def _alias_names(name: str) -> list:
+    """The name itself and, for names like "Korea, Republic of", the name in reading order."""
+    names = [name]
+    if name.count(',') == 1:
+        last, first = name.split(',')
+        names.append(f'{first} {last}')
+    return names
+
+
+def _country_aliases() -> pd.DataFrame:
     try:
-        country = pycountry.countries.search_fuzzy(country_name)[0]
-        return country.alpha_3
+        aliases = cache.read_csv(_COUNTRY_ALIASES_PATH, keep_default_na=False)
+    except (OSError, ValueError) as e:
+        _log.warning(f'Could not load country aliases: {e}')
+        return pd.DataFrame(columns=['COUNTRY', 'ISO'])
+    # Only keep codes that country_name_from_iso knows
+    known = {c.alpha_3 for c in pycountry.countries} | set(_ISO_OVERRIDE)
+    return aliases[aliases.ISO.isin(known)]
+
+
+def _build_country_index() -> dict:
+    """Normalised country names and aliases to ISO codes. Later sources take precedence over earlier ones."""
+    names = []
+    aliases = _country_aliases()
+    names.extend(zip(aliases.COUNTRY, aliases.ISO))
+    names.extend((name, iso) for iso, name in _ISO_OVERRIDE.items())
+    for attribute in ['official_name', 'common_name', 'name']:
+        names.extend((getattr(c, attribute), c.alpha_3) for c in pycountry.countries if hasattr(c, attribute))
+
+    index = {}
+    for name, iso in names:
+        for alias in _alias_names(name):
+            index[_normalise_country_name(alias)] = iso
+    return index
+
+
+def _get_country_index() -> dict:
+    global _country_index
+    with _country_index_lock:
+        if _country_index is None:
+            _country_index = _build_country_index()
+        return _country_index
+
+
+@functools.lru_cache(maxsize=None)
+def _fuzzy_country_iso(country_name):
+    try:
+        return pycountry.countries.search_fuzzy(country_name)[0].alpha_3
     except LookupError:
         return None
 
 
+def get_country_iso(country_name):
+    # Country names in the sources are a wonderful mix of official and common names, so we look them up in an
+    # index of all known names and aliases, with a fuzzy search for names that are not in it
+    iso = _get_country_index().get(_normalise_country_name(country_name))
+    if iso is not None:
+        return iso
+    return _fuzzy_country_iso(country_name)
+
+
+def country_isos(country_names: pd.Series) -> pd.Series:
+    """
+    Resolve a series of country names to ISO codes, None where a name is not recognised.
+    Each distinct name is only resolved once.
+    """
+    isos = {name: get_country_iso(name) for name in country_names.dropna().unique()}
+    return country_names.map(isos)
+
+
 def last_day_of_calenderweek(year, week):
     first = datetime.date(year, 1, 1)
     base = 1 if first.isocalendar()[1] == 1 else 8
     return first + datetime.timedelta(days=base - first.isocalendar()[2] + 7 * (week - 1) + 6)
 
 
+def week_end_dates(years, weeks) -> pd.DatetimeIndex:
+    """
+    Returns the last day, a Sunday, of ISO calendar weeks. The same as last_day_of_calenderweek, for whole arrays.
+    Week 1 of a year is the week with the 4th of January in it, so years with 53 weeks are handled.
+
+    :param years: Year of each week, or a single year for all of them
+    :param weeks: Week numbers
+    """
+    years, weeks = np.broadcast_arrays(np.asarray(years, dtype=np.int64), np.atleast_1d(np.asarray(weeks, dtype=np.int64)))
+    january_4 = (years - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64) + 3
+    first_monday = january_4 - (january_4 + 3) % 7  # The 1st of January 1970 was a Thursday
+    last_days = first_monday + 7 * (weeks - 1) + 6
+    return pd.DatetimeIndex(last_days.astype('datetime64[D]').astype('datetime64[ns]'))
+
+
 def country_name_from_iso(iso):
     if iso in _ISO_OVERRIDE:
         return _ISO_OVERRIDE[iso]
     else:
         return pycountry.countries.get(alpha_3=iso).name
+
+
+def first_date_above(df: pd.DataFrame, columns: list, threshold: float = 0, group: str = ISO_COLUMN_NAME,
+                     date: str = DATE_COLUMN_NAME) -> pd.DataFrame:
+    """
+    Returns the first date on which each column is above a threshold, for each group.
+    Groups in which a column never goes above the threshold get their last date.
+
+    :param df: Data in long format
+    :param columns: Columns to find the first date for
+    :param threshold: Values must be strictly above this
+    :param group: Column identifying the groups, the country ISO code by default
+    :param date: Date column
+    """
+    first = pd.DataFrame({column: df[date].where(df[column] > threshold) for column in columns})
+    first = first.groupby(df[group]).min()
+    last = df.groupby(group)[date].max()
+    for column in columns:
+        first[column] = first[column].fillna(last)
+    return first
+
+
+def days_since(df: pd.DataFrame, columns: list, threshold: float = 0, group: str = ISO_COLUMN_NAME,
+               date: str = DATE_COLUMN_NAME) -> pd.DataFrame:
+    """
+    Returns the number of days since each column first went above a threshold in the group of each row.
+    See first_date_above for the arguments.
+    """
+    anchors = first_date_above(df, columns, threshold=threshold, group=group, date=date)
+    return pd.DataFrame({column: (df[date] - df[group].map(anchors[column])).dt.days for column in columns},
+                        index=df.index)
+
+
+def _days(dates: pd.Series) -> np.ndarray:
+    return pd.to_datetime(dates).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+
+def _take(column: pd.Series, rows: np.ndarray) -> np.ndarray:
+    """Values of a column at the given row positions, missing where the position is -1."""
+    return column.reset_index(drop=True).reindex(rows).to_numpy()
+
+
+def weekly_to_daily(df: pd.DataFrame, groups: list, date: str = DATE_COLUMN_NAME, days_before: int = 0,
+                    last_date: str = None, fill_columns: list = None, method: str = 'bfill', limit: int = None,
+                    skipna: bool = True) -> pd.DataFrame:
+    """
+    Expands weekly (or any periodic) rows to a row per day, for all groups at once.
+
+    Each group gets a row for every day from its first date minus days_before to its last date.
+    The rows of a group must have distinct dates. Rows with a missing group key are dropped.
+
+    :param df: Data with a row per group and period
+    :param groups: Columns identifying the groups
+    :param date: Date of each row
+    :param days_before: Number of days to add before the first date of each group, e.g. 6 when dates are week ends
+    :param last_date: Column with the last day covered by each row. Defaults to the date column.
+    :param fill_columns: Columns filled from the rows of other days. Other columns only have values on the dates
+                         of the rows. Defaults to all columns.
+    :param method: 'bfill' to fill from the next row of the group, 'ffill' from the previous one
+    :param limit: Maximum number of days to fill from a row, no limit by default
+    :param skipna: If true, rows with a missing value in a column are skipped when filling that column,
+                   as in DataFrame.bfill. Otherwise whole rows are carried over, as when upsampling.
+    :return: The group columns, the date and the other columns, sorted by group and date
+    """
+    if method not in ('bfill', 'ffill'):
+        raise ValueError(f'Unknown fill method {method}')
+    limit = np.inf if limit is None else limit
+
+    df = df.dropna(subset=groups)
+    codes = df.groupby(groups, sort=True).ngroup().to_numpy()
+    group_count = codes.max() + 1 if len(codes) else 0
+    days = _days(df[date])
+    last_days = days if last_date is None else _days(df[last_date])
+
+    first = np.full(group_count, np.iinfo(np.int64).max)
+    np.minimum.at(first, codes, days)
+    first -= days_before
+    last = np.full(group_count, np.iinfo(np.int64).min)
+    np.maximum.at(last, codes, last_days)
+
+    lengths = last - first + 1
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    ends = starts + lengths
+    group_of_day = np.repeat(np.arange(group_count), lengths)
+    positions = np.arange(lengths.sum())
+    daily_dates = (first[group_of_day] + positions - starts[group_of_day]).astype('datetime64[D]')
+
+    rows = np.full(len(positions), -1)
+    rows[starts[codes] + days - first[codes]] = np.arange(len(df))
+
+    def _filled_rows(valid):
+        if method == 'bfill':
+            source = np.where(valid, positions, len(positions))
+            source = np.minimum.accumulate(source[::-1])[::-1]
+            found = (source < ends[group_of_day]) & (source - positions <= limit)
+        else:
+            source = np.maximum.accumulate(np.where(valid, positions, -1))
+            found = (source >= starts[group_of_day]) & (positions - source <= limit)
+        return np.where(found, rows[np.where(found, source, 0)], -1)
+
+    group_rows = np.empty(group_count, dtype=np.int64)
+    group_rows[codes] = np.arange(len(df))
+    daily = pd.DataFrame({column: _take(df[column], group_rows)[group_of_day] for column in groups})
+    daily[date] = pd.DatetimeIndex(daily_dates.astype('datetime64[ns]'))
+
+    columns = [c for c in df.columns if c not in groups and c != date]
+    fill_columns = columns if fill_columns is None else fill_columns
+    filled_rows = None if skipna else _filled_rows(rows >= 0)
+    for column in columns:
+        if column not in fill_columns:
+            daily[column] = _take(df[column], rows)
+        elif skipna:
+            valid = rows >= 0
+            valid[valid] = df[column].notna().to_numpy()[rows[valid]]
+            daily[column] = _take(df[column], _filled_rows(valid))
+        else:
+            daily[column] = _take(df[column], filled_rows)
+    return daily
@@ -4,6 +4,7 @@ import datetime
 import logging
 
 from .constants import *
+from . import cache, instrumentation
 import requests
 from .utils import get_country_iso
 _log = logging.getLogger(__name__)
@@ -26,9 +27,10 @@ COLUMN_NAMES = {
     'Wind_Speed_Weighted_Daily_Average_mean': 'weather_wind_speed_mean'
 }
 
+@instrumentation.instrumented()
 def _load_dataset() -> pd.DataFrame:
   _log.info(f'Loading weather data from {_PATH}')
-  df = pd.read_csv(_PATH, parse_dates=['Date'])
+  df = cache.read_csv(_PATH, parse_dates=['Date'])
   df = df.rename(columns={'Date': DATE_COLUMN_NAME, 'ISO': ISO_COLUMN_NAME})
   _log.info('Weather data loaded')
   return df
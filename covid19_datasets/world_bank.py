@@ -1,5 +1,6 @@
 import pandas as pd
-from pandas_datareader import wb
+from concurrent.futures import ThreadPoolExecutor
+from . import cache, instrumentation
 
 
 import logging
@@ -67,23 +68,55 @@ AGGREGATES = [
 
 
 # Temporarily use HTTP due to SSL certificate error
-wb.WB_API_URL = 'http://api.worldbank.org/v2'
+_API_URL = 'http://api.worldbank.org/v2'
+_INDICATOR_URL_FORMAT = _API_URL + '/countries/all/indicators/{indicator}?date={start}:{end}&per_page=25000&format=json'
+_COUNTRIES_URL = _API_URL + '/countries/?per_page=1000&format=json'
+_MAX_WORKERS = 8
 
 
+def _read_api(url: str) -> list:
+    """
+    Reads a World Bank API response through the cache, returning its records.
+    Responses are a list of the paging information, or an error message, and the records.
+    """
+    response = cache.read_json(url)
+    if 'message' in response[0]:
+        raise ValueError(f'Problem with a World Bank query {url}: {response[0]["message"]}')
+    if not response[1]:
+        raise ValueError(f'No results found from World Bank query {url}')
+    return response[1]
+
+
+@instrumentation.instrumented()
+def _load_indicator(name: str, indicator: str, start: int, end: int) -> pd.Series:
+    """
+    Loads the latest value of an indicator in the year range for every country.
+    Responses are cached by URL, which holds the indicator and the year range.
+    """
+    records = _read_api(_INDICATOR_URL_FORMAT.format(indicator=indicator, start=start, end=end))
+    data = pd.DataFrame({
+        'country': [r['country']['value'] for r in records],
+        'year': [r['date'] for r in records],
+        name: pd.to_numeric(pd.Series([r['value'] for r in records], dtype=object)),
+    })
+    return data.set_index(['country', 'year']).sort_index().groupby(level=0)[name].last()
+
+
+@instrumentation.instrumented()
 def _load_dataset(start=2010, end=2020, extra_indicators={}):
     _log.info("Loading dataset")
     indicators = dict(WORLD_BANK_INDICATORS, **extra_indicators)
 
-    all_data = []
-    for name, series in indicators.items():
-        data = wb.download(indicator=series, country='all', start=start, end=end)
-        all_data.append(data.sort_index().groupby(level=0).last().rename(columns={series: name}))
+    with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as executor:
+        futures = [executor.submit(instrumentation.run_in_context(_load_indicator), name, series, start, end)
+                   for name, series in indicators.items()]
+        all_data = [future.result() for future in futures]
 
     country_data = pd.concat(all_data, axis=1)
     country_data.index = country_data.index.set_names(['country'])
     
     # Add ISO
-    mapping = wb.get_countries()[['name', 'iso3c']].rename(columns={'iso3c': 'ISO'})
+    mapping = pd.DataFrame([(c['name'], c['id']) for c in _read_api(_COUNTRIES_URL)], columns=['name', 'ISO'])
     country_data = (country_data.reset_index()
                     .merge(mapping, left_on='country', right_on='name', how='inner')
                     .drop('name', axis='columns'))
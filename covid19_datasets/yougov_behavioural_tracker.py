@@ -1,4 +1,8 @@
+import io
+import threading
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from . import cache, instrumentation
 
 
 import logging
@@ -38,26 +42,93 @@ COUNTRIES = [
 COUNTRY_PATH_FORMAT = 'https://raw.githubusercontent.com/YouGov-Data/covid-19-tracker/master/data/{}.csv'
 
 
+_ENCODINGS = ['utf-8', 'cp1252']  # Some of the files are not UTF-8
+_MAX_WORKERS = 8
+
+# Parsed frame of each country with the cached file it was parsed from, so unchanged files are not parsed again
+_parsed = {}
+_parsed_lock = threading.Lock()
+
+
+def _decode(content: bytes, path: str) -> str:
+    for encoding in _ENCODINGS:
+        try:
+            return content.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f'Unknown encoding of {path}')
+
+
+@instrumentation.instrumented()
+def _load_country(country: str) -> pd.DataFrame:
+    path = COUNTRY_PATH_FORMAT.format(country.replace(' ', '-'))
+    _log.info(f"Loading {country} from " + path)
+    local_path = cache.fetch(path)
+    with _parsed_lock:
+        if country in _parsed and _parsed[country][0] == local_path:
+            return _parsed[country][1]
+
+    with open(local_path, 'rb') as f:
+        country_df = pd.read_csv(io.StringIO(_decode(f.read(), path)))
+    country_df['country'] = country
+
+    with _parsed_lock:
+        _parsed[country] = (local_path, country_df)
+    return country_df
+
+
+def _harmonise(frames: list) -> list:
+    """
+    Gives each column the same type in every country. Numbers read as text in some countries are converted
+    to numbers, and columns that really hold text in some country are text everywhere.
+    """
+    columns = {}
+    for df in frames:
+        for column, dtype in df.dtypes.items():
+            columns.setdefault(column, set()).add(pd.api.types.is_numeric_dtype(dtype))
+
+    frames = [df.copy(deep=False) for df in frames]
+    for column, numeric in columns.items():
+        if numeric != {True, False}:
+            continue
+        try:
+            for df in frames:
+                if column in df and not pd.api.types.is_numeric_dtype(df[column]):
+                    df[column] = pd.to_numeric(df[column])
+        except (ValueError, TypeError):
+            for df in frames:
+                if column in df:
+                    df[column] = df[column].astype(object)
+    return frames
+
+
+def _compact(df: pd.DataFrame) -> pd.DataFrame:
+    """Stores text columns with few distinct values, such as survey answers, as categories."""
+    for column in df.columns[df.dtypes == object]:
+        values = df[column].dropna()
+        if values.nunique() <= len(df) // 2 and values.map(lambda v: isinstance(v, str)).all():
+            df[column] = df[column].astype('category')
+    return df
+
+
+@instrumentation.instrumented()
 def _load_dataset():
     _log.info("Loading dataset")
+    with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as executor:
+        futures = {country: executor.submit(instrumentation.run_in_context(_load_country), country)
+                   for country in COUNTRIES}
+
     all_data = []
-    for country in COUNTRIES:
-        country_name = country.replace(' ', '-')
-        path = COUNTRY_PATH_FORMAT.format(country_name)
+    for country, future in futures.items():
         try:
-            _log.info(f"Loading {country} from " + path)
-            country_df = pd.read_csv(path)
-        except:
-            try:
-                country_df = pd.read_csv(path, encoding='cp1252')
-            except:
-                _log.error(f'ERROR WITH {country}')
-
-        country_df['country'] = country
-        all_data.append(country_df)
+            all_data.append(future.result())
+        except Exception:
+            _log.exception(f'ERROR WITH {country}')
+    if not all_data:
+        raise RuntimeError('YouGov data unavailable')
     _log.info("Loaded")
 
-    return pd.concat(all_data, axis=0)
+    return _compact(pd.concat(_harmonise(all_data), axis=0))
 
 
 class YouGovBehaviouralTracker:
@@ -80,6 +151,7 @@ class YouGovBehaviouralTracker:
 
     def get_data(self):
         """
-        Returns the dataset as Pandas dataframe
+        Returns the dataset as Pandas dataframe.
+        Text columns with few distinct values, such as most survey answers, are categorical.
         """
         return YouGovBehaviouralTracker.data